@@ -0,0 +1,202 @@
+# Autostart supervisor.
+#
+# Replaces the old autostart_x11.sh, which qtile ran with a blocking
+# subprocess.call() and which started everything one after another as
+# untracked background jobs. Steps here form a small dependency graph
+# (setup → daemons → tray apps → user apps); independent steps start in
+# parallel as asyncio subprocesses on qtile's own loop, daemons are restarted
+# when they crash, and every step is timed. Timings end up in qtile.log and in
+# `autostart.supervisor.timings`.
+
+import asyncio
+import os
+import time
+
+from libqtile.utils import logger
+
+HOME = os.path.expanduser("~")
+QTILE_DIR = os.path.join(HOME, ".config/qtile")
+
+ONESHOT = "oneshot"  # dependents wait until it exited
+DAEMON = "daemon"    # dependents wait until it was spawned; restarted if it crashes
+APP = "app"          # spawned once, not supervised
+
+
+class Step:
+    def __init__(self, name, cmd, kind=APP, after=(), when=None):
+        self.name = name
+        self.cmd = cmd
+        self.kind = kind
+        self.after = tuple(after)
+        self.when = when  # optional path that must be executable
+
+
+# Session environment for everything we start. These used to be `export`s in
+# autostart_x11.sh, so like before they only reach our children, not qtile.
+SESSION_ENV = {
+    "PATH": "/usr/local/bin:" + os.environ.get("PATH", ""),
+    # For GTK applications
+    "GTK_THEME": "Adwaita:dark",
+    "GTK_APPLICATION_PREFERENCES": "prefer-dark-theme=1",
+    "XDG_CURRENT_DESKTOP": "Qtile",
+    "DESKTOP_SESSION": "qtile",
+    # For Qt applications (Qt 5 and 6)
+    "QT_STYLE_OVERRIDE": "adwaita-dark",
+    "QT_QPA_PLATFORMTHEME": "qt5ct",
+    # Cursor + View Settings
+    "QTILE_CHECK_SKIP_STUBS": "1",
+    "XCURSOR_THEME": "Dracula",
+    "XCURSOR_SIZE": "24",
+}
+
+X11_STEPS = [
+    # ── Session setup ───────────────────────────────────────────────────────
+    Step("gtk-theme", ["gsettings", "set", "org.gnome.desktop.interface", "gtk-theme", "Adwaita:dark"], ONESHOT),
+    Step("wm-desktop-env", ["xprop", "-root", "-set", "_NET_WM_DESKTOP_ENVIRONMENT", "Qtile"], ONESHOT),
+    Step("flatpak-theme", ["flatpak", "override", "--user", "--env=GTK_THEME=Adwaita:dark"], ONESHOT),
+    # blank after 5 min
+    Step("screensaver", ["xset", "s", "300", "-dpms"], ONESHOT),
+    # Keyring is handled in the session autostart now (bin/starting-qtile.sh)
+
+    # ── Daemons ─────────────────────────────────────────────────────────────
+    # notification daemon
+    Step("dunst", ["/usr/local/bin/dunst"], DAEMON),
+    # KDE Polkit agent (works with Qtile)
+    Step("polkit", ["/usr/libexec/polkit-kde-authentication-agent-1"], DAEMON,
+         when="/usr/libexec/polkit-kde-authentication-agent-1"),
+    # wallpaper service, a new random one every 5 min
+    Step("wallpaper", [os.path.join(QTILE_DIR, "wallpaper_x11.sh")], DAEMON),
+    # on suspend/idle, pick a random lock-image and run i3lock
+    Step("xss-lock", ["dbus-run-session", "--exit-with-session", "xss-lock", "--",
+                      os.path.join(QTILE_DIR, "lock_with_random_bg_x11.sh")],
+         DAEMON, after=["screensaver"]),
+    # ready-made lock images at the combined resolution (lock_with_random_bg_x11.sh)
+    Step("lock-pool", ["nice", "-n", "19", "python3", os.path.join(QTILE_DIR, "wallpapers.py"), "lock-fill"],
+         APP, after=["wallpaper"]),
+    # compositor for transparency/shadows (X11 sessions)
+    # Step("picom", ["picom", "--config", os.path.join(HOME, ".config/picom/picom.conf")], DAEMON),
+
+    # ── Tray apps ───────────────────────────────────────────────────────────
+    Step("nm-applet", ["nm-applet"], DAEMON, after=["dunst"]),
+    # Step("blueman", ["blueman-applet"], DAEMON, after=["dunst"]),  # not on these corpo distros
+    # screenshots; APP, not DAEMON: quitting it from the tray must not respawn
+    # it, and the flatpak launcher may fork and exit
+    Step("flameshot", ["flatpak", "run", "org.flameshot.Flameshot"], APP, after=["dunst", "flatpak-theme"]),
+    # clipboard manager (dnf install copyq); started once, like flameshot
+    Step("copyq", ["copyq"], APP, after=["dunst"]),
+
+    # ── User applications ───────────────────────────────────────────────────
+    Step("brave", ["flatpak", "run", "com.brave.Browser"], APP,
+         after=["polkit", "nm-applet", "flatpak-theme", "gtk-theme"]),
+    Step("obsidian", ["flatpak", "run", "md.obsidian.Obsidian"], APP,
+         after=["polkit", "flatpak-theme", "gtk-theme"]),
+    Step("codium", ["codium"], APP, after=["polkit", "gtk-theme"]),
+    Step("nautilus", ["nautilus"], APP, after=["polkit", "gtk-theme"]),
+]
+
+WAYLAND_STEPS = [
+    Step("autostart_wayland.sh", [os.path.join(QTILE_DIR, "autostart_wayland.sh")], APP),
+]
+
+
+class Supervisor:
+    def __init__(self, steps, env=None, max_restarts=5, restart_window=60):
+        self.steps = {step.name: step for step in steps}
+        self.env = dict(os.environ, **(env or {}))
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.timings = {}  # { name: ms after start when the step was ready }
+        self.processes = {}
+        self._ready = {}
+        self._tasks = []
+        self._start = None
+
+    def start(self):
+        """
+        Schedule all steps on the running loop and return immediately.
+        """
+        self._start = time.monotonic()
+        self._ready = {name: asyncio.Event() for name in self.steps}
+        self._tasks = [asyncio.ensure_future(self._run(step)) for step in self.steps.values()]
+        asyncio.ensure_future(self._report())
+
+    def _elapsed_ms(self):
+        return (time.monotonic() - self._start) * 1000
+
+    async def _spawn(self, step):
+        return await asyncio.create_subprocess_exec(
+            *step.cmd, env=self.env, stdin=asyncio.subprocess.DEVNULL,
+        )
+
+    async def _run(self, step):
+        try:
+            for dep in step.after:
+                if dep in self._ready:
+                    await self._ready[dep].wait()
+            if step.when and not os.access(step.when, os.X_OK):
+                self.timings[step.name] = None
+                return
+            started = time.monotonic()
+            try:
+                proc = await self._spawn(step)
+            except OSError as err:
+                logger.warning(f"autostart: {step.name} failed to start: {err}")
+                return
+            self.processes[step.name] = proc
+            if step.kind == ONESHOT:
+                rc = await proc.wait()
+                if rc:
+                    logger.warning(f"autostart: {step.name} exited with {rc}")
+            self.timings[step.name] = round(self._elapsed_ms(), 1)
+            logger.info(
+                f"autostart: {step.name} ready after {self.timings[step.name]} ms "
+                f"(step took {(time.monotonic() - started) * 1000:.1f} ms)"
+            )
+            self._ready[step.name].set()
+            if step.kind == DAEMON:
+                await self._supervise(step, proc)
+            elif step.kind == APP:
+                await proc.wait()  # reap it
+        finally:
+            # never leave dependents hanging on a skipped or failed step
+            self._ready[step.name].set()
+
+    async def _supervise(self, step, proc):
+        restarts = []
+        while True:
+            rc = await proc.wait()
+            if rc == 0:
+                # quit on purpose, e.g. from its tray icon, or dunst finding
+                # another notification daemon on the bus
+                logger.info(f"autostart: {step.name} exited cleanly, not restarting")
+                return
+            now = time.monotonic()
+            restarts = [t for t in restarts if now - t < self.restart_window] + [now]
+            if len(restarts) > self.max_restarts:
+                logger.warning(f"autostart: {step.name} keeps dying (rc={rc}), giving up")
+                return
+            logger.warning(f"autostart: {step.name} exited with {rc}, restarting")
+            await asyncio.sleep(min(2 ** (len(restarts) - 1), 30))
+            try:
+                proc = await self._spawn(step)
+            except OSError as err:
+                logger.warning(f"autostart: {step.name} failed to restart: {err}")
+                return
+            self.processes[step.name] = proc
+
+    async def _report(self):
+        await asyncio.gather(*(event.wait() for event in self._ready.values()))
+        logger.info(f"autostart: desktop usable after {self._elapsed_ms():.1f} ms")
+
+
+supervisor = None
+
+
+def start(wayland=False):
+    global supervisor
+    if wayland:
+        supervisor = Supervisor(WAYLAND_STEPS)
+    else:
+        supervisor = Supervisor(X11_STEPS, env=SESSION_ENV)
+    supervisor.start()
+    return supervisor
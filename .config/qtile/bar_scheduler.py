@@ -0,0 +1,156 @@
+# Coalesced bar redraws.
+#
+# Every widget normally redraws the moment its own timer fires, so widgets on
+# slightly different intervals repaint the translucent bars many times a
+# second. A ScheduledBar instead queues invalidations for one frame window and
+# then repaints only what changed: the ScheduledDraw widgets that asked for it,
+# or the whole bar if something needed a relayout (e.g. a width change). Both
+# are subclasses, so nothing is patched at runtime and a reload simply builds
+# new bars.
+#
+# Counters are available from a running qtile with
+#   qtile cmd-obj -o root -f eval -a "__import__('bar_scheduler').scheduler.stats()"
+
+import time
+
+from libqtile import bar, qtile, widget
+from libqtile.utils import logger
+
+
+class FrameScheduler:
+    def __init__(self, frame_interval=0.05):
+        self.frame_interval = frame_interval
+        self._dirty_widgets = {}  # { widget: None }, keeps insertion order
+        self._dirty_bars = {}
+        self._timer = None
+        self.flushing = False
+        self.reset_stats()
+
+    def forget(self, bar):
+        """
+        Drop pending draws of a bar that is being finalized.
+        """
+        self._dirty_bars.pop(bar, None)
+        for w in bar.widgets:
+            self._dirty_widgets.pop(w, None)
+
+    # ── invalidation ───────────────────────────────────────────────────────
+    def invalidate(self, widget):
+        self._dirty_widgets[widget] = None
+        self._schedule()
+
+    def invalidate_bar(self, bar):
+        self._dirty_bars[bar] = None
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = qtile.call_later(self.frame_interval, self.flush)
+
+    # ── drawing ────────────────────────────────────────────────────────────
+    def flush(self):
+        self._timer = None
+        bars, self._dirty_bars = self._dirty_bars, {}
+        widgets, self._dirty_widgets = self._dirty_widgets, {}
+
+        self.flushing = True
+        try:
+            for b in bars:
+                # full relayout + repaint, right now; this covers its widgets
+                if b.widgets:
+                    self._timed(b._actual_draw, full=True)
+            for w in widgets:
+                if w.bar not in bars:
+                    self._timed(w.draw, full=False)
+        finally:
+            self.flushing = False
+        self.frames += 1
+
+    def _timed(self, draw, full):
+        start = time.perf_counter()
+        try:
+            draw()
+        except Exception:
+            logger.exception("Deferred bar draw failed")
+            return
+        self.draw_time += time.perf_counter() - start
+        if full:
+            self.bar_draws += 1
+        else:
+            self.widget_draws += 1
+
+    # ── counters ───────────────────────────────────────────────────────────
+    def reset_stats(self):
+        self.frames = 0
+        self.bar_draws = 0
+        self.widget_draws = 0
+        self.draw_time = 0.0
+        self._since = time.monotonic()
+
+    def stats(self):
+        elapsed = max(time.monotonic() - self._since, 1e-6)
+        draws = self.bar_draws + self.widget_draws
+        return dict(
+            frames_per_second=round(self.frames / elapsed, 2),
+            draws_per_second=round(draws / elapsed, 2),
+            bar_draws=self.bar_draws,
+            widget_draws=self.widget_draws,
+            ms_per_draw=round(self.draw_time * 1000 / draws, 3) if draws else 0.0,
+        )
+
+
+scheduler = FrameScheduler()
+
+
+class ScheduledBar(bar.Bar):
+    """
+    Bar whose draw() requests are coalesced per frame by the scheduler, which
+    then calls _actual_draw() itself (Bar.draw would only queue it for later).
+    """
+
+    def draw(self):
+        if self.widgets:
+            scheduler.invalidate_bar(self)
+
+    def _actual_draw(self):
+        # the ScheduledDraw widgets have to paint now, not queue another frame
+        flushing, scheduler.flushing = scheduler.flushing, True
+        try:
+            bar.Bar._actual_draw(self)
+        finally:
+            scheduler.flushing = flushing
+
+    def finalize(self):
+        scheduler.forget(self)
+        bar.Bar.finalize(self)
+
+
+class ScheduledDraw:
+    """
+    Widget mixin: draw() requests are coalesced per frame by the scheduler.
+    Put it before the widget class, e.g. `class Clock(ScheduledDraw,
+    widget.Clock)`, or use scheduled().
+    """
+
+    def draw(self):
+        if scheduler.flushing:
+            super().draw()
+        else:
+            scheduler.invalidate(self)
+
+
+def scheduled(widget_class):
+    """
+    widget_class with ScheduledDraw mixed in. If its dependencies are missing,
+    qtile hands out a function that builds an error widget instead of the
+    class; that is returned unchanged.
+    """
+    if not isinstance(widget_class, type):
+        return widget_class
+    return type(widget_class)(widget_class.__name__, (ScheduledDraw, widget_class),
+                              {"__module__": __name__})
+
+
+Clock = scheduled(widget.Clock)
+PulseVolume = scheduled(widget.PulseVolume)
+CheckUpdates = scheduled(widget.CheckUpdates)
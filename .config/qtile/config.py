@@ -24,14 +24,19 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import os
+import time
+import autostart
 import colors as color_mod
-import subprocess
+import bar_scheduler
+import providers
+import screen_topology
 from zoneinfo import ZoneInfo 
 from libqtile import bar, layout, qtile, widget, hook
 from libqtile.config import Click, Drag, Group, Key, Match, Screen
 from libqtile.lazy import lazy
 from libqtile.utils import guess_terminal, logger
+from float_rules import IndexedFloating
+from routing import RoutingTable, rule
 from qtile_extras import widget as xwidget 
 from types import FunctionType
 
@@ -259,7 +264,7 @@ extension_defaults = widget_defaults.copy()
 def toggle_vol_text(qtile):
     w = qtile.widgets_map["pulsevolume"]
     w.fmt = "" if w.fmt.endswith("{}") else " {}"   # no percent sign
-    w.bar.draw()
+    w.bar.draw()   # queued by the frame scheduler, not drawn right away
     
 @lazy.function
 def power_menu(qtile):
@@ -274,11 +279,15 @@ def power_menu(qtile):
         "elif [ \"$code\" -eq 1 ]; then systemctl reboot; fi'"
     )
 
-# Detect number of connected monitors via xrandr
+# Detect number of connected monitors from the cached RandR topology
+# (see screen_topology.py); only the first load after login actually probes.
 
 def get_monitor_count():
-    output = subprocess.check_output(["xrandr", "--query"]).decode()
-    return sum(1 for line in output.splitlines() if " connected" in line)
+    start = time.perf_counter()
+    count = screen_topology.monitor_count()
+    elapsed = (time.perf_counter() - start) * 1000
+    logger.info(f"Config load spent {elapsed:.2f} ms on monitor detection ({count} monitors)")
+    return count
 
 monitor_count = get_monitor_count()
 
@@ -306,7 +315,7 @@ def init_widgets(include_systray=True):
         widget.Spacer(length=6),
         # ---- centre ---------------------------------------------------------
         widget.Spacer(length=bar.STRETCH),
-        widget.Clock(
+        bar_scheduler.Clock(              # redraws go through the frame scheduler
             format="%H:%M   %d-%m-%Y",
             timezone=ZoneInfo("Europe/Vienna"),
             foreground = doom_colors[1],
@@ -314,10 +323,12 @@ def init_widgets(include_systray=True):
         widget.Spacer(length=bar.STRETCH),
 
         # ---- RIGHT cluster --------------------------------------------------
-        widget.Net(
+        # Net/Memory/CPU read from the shared providers (providers.py), so
+        # every extra monitor costs a redraw, not another poll.
+        providers.ProviderText(
+            providers.net,
             # ▾/▴ are 1-char arrows from the Nerd-Font set
             format="{down:.0f}{down_suffix}▾{up:.0f}{up_suffix}▴",
-            update_interval=3,
             mouse_callbacks={
                 "Button3": lazy.spawn("nm-connection-editor"),  # right-click → open NetworkManager GUI
             },
@@ -325,7 +336,7 @@ def init_widgets(include_systray=True):
         ),
         #xwidget.Bluetooth(),                 # from qtile-extras
         #widget.Battery(format="  {percent:2.0%}", low_percentage=0.15),
-        widget.PulseVolume(
+        bar_scheduler.PulseVolume(
             name="pulsevolume",
             foreground = doom_colors[7],
             fmt=" {}",                       # single value, no % sign
@@ -337,19 +348,18 @@ def init_widgets(include_systray=True):
                 "Button5": lazy.spawn("pactl set-sink-volume @DEFAULT_SINK@ -5%"),    # vol –5 %
             },
         ),
-        widget.Memory(
+        providers.ProviderText(
+            providers.memory,              # sampled in GiB, see providers.py
             foreground = doom_colors[8],
             format="{MemUsed:4.1f}G",   # e.g. “  7.6 G”
-            measure_mem="G",               # tell the widget we want GiB/GB
-            update_interval=2,
         ),
-        widget.CPU(foreground = doom_colors[4],format=" {load_percent:>3}%", update_interval=2)
+        providers.ProviderText(providers.cpu, foreground = doom_colors[4],format=" {load_percent:>3}%")
         ]
     if include_systray:
         widgets.append(widget.Systray(icon_size=12, padding=2))
     widgets.extend([
         widget.Spacer(length=3),
-        widget.CheckUpdates(
+        bar_scheduler.CheckUpdates(
             distro="Fedora",  # This uses the DNF backend, which works for Rocky/RHEL
             display_format="󱧕 {updates}", #  is a Nerd Font package icon
             no_update_string="󱧕 0",
@@ -405,10 +415,31 @@ def init_widgets(include_systray=True):
 # For ex: Screen(top=bar.Bar(widgets=init_widgets_screen2(), background="#00000000", size=24)),
 
 # Create one Screen/bar per detected monitor
-screens = [
-    Screen(top=bar.Bar(init_widgets(include_systray=(i == 0)), 28, opacity=0.70))
-    for i in range(monitor_count)
-]
+# Bars go through the frame scheduler (bar_scheduler.py): widget updates within
+# one frame are batched and only the changed widgets are repainted.
+def init_screen(index):
+    return Screen(top=bar_scheduler.ScheduledBar(
+        init_widgets(include_systray=(index == 0)), 28, opacity=0.70
+    ))
+
+def init_screens(count):
+    return [init_screen(i) for i in range(count)]
+
+screens = init_screens(monitor_count)
+
+@hook.subscribe.screen_change
+def refresh_screens(event):
+    """
+    Re-read the topology on hotplug. qtile's own reconfigure_screens runs
+    after this hook and picks up the updated list in place. Screens that are
+    still there keep their bars (there may only be one Systray, and
+    widgets_map keeps pointing at live widgets); only screens past the old
+    count are added or dropped.
+    """
+    if screen_topology.refresh():
+        count = screen_topology.monitor_count()
+        del screens[count:]
+        screens.extend(init_screen(i) for i in range(len(screens), count))
 
 # drag floating window with Mod + left-click
 Drag([mod], "Button1", lazy.window.set_position_floating(),
@@ -430,7 +461,8 @@ follow_mouse_focus = True
 bring_front_click = True
 floats_kept_above = True
 cursor_warp = True
-floating_layout = layout.Floating(
+# Exact wm_class/title rules are hashed, regex rules memoized (float_rules.py)
+floating_layout = IndexedFloating(
     float_rules=[
         # Run the utility of `xprop` to see the wm class and name of an X client.
         *layout.Floating.default_float_rules,
@@ -469,54 +501,43 @@ wl_input_rules = None
 wl_xcursor_theme = "Dracula"
 wl_xcursor_size = 24
 
+# Compiled once per config load, see routing.py.
+# Format: rule("group_name", switch=<switch to group after moving>, <match>)
+# Run `xprop | grep WM_CLASS` in a terminal and click on a window
+# to find its wm_class.
+app_routes = RoutingTable([
+    rule("1", switch=True, wm_class="Brave-browser"),
+    rule("2", switch=True, wm_class="VSCodium"),
+    rule("5", wm_class="obsidian"),
+    rule("6", wm_class="Nautilus"),
+    rule("7", switch=True, wm_class="KeePassXC"),
+])
+
 @hook.subscribe.client_new
 def assign_app_group(client):
     """
-    Automatically move windows to designated groups based on their WM_CLASS.
-    Run `xprop | grep WM_CLASS` in a terminal and click on a window
-    to find its wm_class.
+    Automatically place windows in designated groups based on their
+    WM_CLASS (or role/title, see routing.py).
+
+    This runs before qtile adds the window to any group, so the window is
+    laid out exactly once: either straight into a hidden target group, or,
+    when switching, the target group is shown first and qtile then adds the
+    window to it as the current group.
     """
-    # Use a dict for easy lookup
-    # Format: { "wm_class": ("group_name", options) }
-    # options: "switch" = switch to group after moving
-
-    d = {
-        "Brave-browser": ("1", "switch"),  
-        "VSCodium":      ("2", "switch"),  
-        "obsidian":      ("5", None),       
-        "Nautilus":      ("6", None), 
-        "KeePassXC":     ("7", "switch")     
-    }
-
-    # Get the wm_class
     try:
-
-        wm_class_tuple = client.window.get_wm_class()
-        if not wm_class_tuple:
-            return
-        # UNCOMMENT to debug in ~/.local/share/qtile/qtile.log
-        # logger.warning(f"New Client WM_CLASS: {wm_class_tuple}")
- # The tuple is (instance, class). We check if *either* is in our dict.
-        matched_key = None
-        for item in wm_class_tuple:
-            if item in d:
-                matched_key = item
-                break
-        
-        # If we found a match...
-        if matched_key:
-            group_name, option = d[matched_key]
-            
-            # Move the window to the target group
-            client.togroup(group_name)
-
-            # Optionally switch focus to that group
-            if option == "switch":
-                # This now works because 'qtile' was imported
-                qtile.groups_map[group_name].toscreen()
-
+        route = app_routes.route(client)
     except (IndexError, TypeError):
         return  # Not all windows have a wm_class
+    # UNCOMMENT to debug in ~/.local/share/qtile/qtile.log
+    # logger.warning(f"New Client WM_CLASS: {client.get_wm_class()} -> {route}")
+    if route is None:
+        return
+
+    group = qtile.groups_map[route.group]
+    if route.switch:
+        group.toscreen()
+    else:
+        client.togroup(route.group)
 
 # XXX: Gasp! We're lying here. In fact, nobody really uses or cares about this
 # string besides java UI toolkits; you can see several discussions on the
@@ -530,10 +551,7 @@ wmname = "LG3D"
 
 @hook.subscribe.startup_once
 def start_once():
-    home = os.path.expanduser('~')
-    if qtile.core.name == "wayland":
-        autostart_script = os.path.join(home, '.config/qtile/autostart_wayland.sh')
-    else:
-        autostart_script = os.path.join(home, '.config/qtile/autostart_x11.sh')
-    subprocess.call([autostart_script])
+    # Non-blocking: steps run as asyncio subprocesses on qtile's loop,
+    # see autostart.py for the dependency graph and per-step timings.
+    autostart.start(wayland=(qtile.core.name == "wayland"))
 
@@ -0,0 +1,179 @@
+# Indexed float-rule matching.
+#
+# Stock Floating.match() runs Match.compare() for every rule on every new
+# window. Most of our rules are a single equality check on wm_class, title,
+# role or wm_type, so those go into per-field hash sets; regex rules are
+# checked once per (wm_class, title, role) and memoized; anything else
+# (func=..., multi-property rules) still goes through Match.compare().
+#
+# Replay benchmark, inside a running qtile (uses the live rules):
+#   QTILE_FLOAT_RECORD=~/.cache/qtile/float_events.jsonl  (set before login)
+#   qtile cmd-obj -o root -f eval -a "__import__('float_rules').benchmark()"
+# or standalone against the default rules:
+#   python float_rules.py ~/.cache/qtile/float_events.jsonl
+
+import json
+import os
+import re
+import sys
+import time
+
+from libqtile import layout
+
+INDEXED_FIELDS = ("wm_class", "wm_instance_class", "title", "role", "wm_type")
+MEMO_FIELDS = {"wm_class", "title", "role"}
+MEMO_SIZE = 512
+DEFAULT_RECORD = os.path.expanduser("~/.cache/qtile/float_events.jsonl")
+
+
+def _window_key(win):
+    wm_class = win.get_wm_class() or ()
+    return tuple(wm_class), win.name or "", win.get_wm_role() or ""
+
+
+class IndexedFloating(layout.Floating):
+    """
+    Drop-in for layout.Floating with an indexed match().
+    """
+
+    def __init__(self, float_rules=None, no_reposition_rules=None, **config):
+        layout.Floating.__init__(self, float_rules, no_reposition_rules, **config)
+        self.record = os.environ.get("QTILE_FLOAT_RECORD")
+        self._compile()
+
+    def _compile(self):
+        self._exact = {field: set() for field in INDEXED_FIELDS}
+        self._memo_rules = []
+        self._other_rules = []
+        self._memo = {}
+
+        for rule in self.float_rules or ():
+            rules = getattr(rule, "_rules", None)
+            if not rules or len(rules) != 1:
+                self._other_rules.append(rule)
+                continue
+            (field, value), = rules.items()
+            if field in INDEXED_FIELDS and isinstance(value, str):
+                self._exact[field].add(value)
+            elif field in MEMO_FIELDS and isinstance(value, re.Pattern):
+                self._memo_rules.append(rule)
+            else:
+                self._other_rules.append(rule)
+
+    def match(self, win):
+        if self.record:
+            self._record(win)
+        wm_class, title, role = key = _window_key(win)
+
+        exact = self._exact
+        if (any(c in exact["wm_class"] for c in wm_class)
+                or (wm_class and wm_class[0] in exact["wm_instance_class"])
+                or title in exact["title"]
+                or role in exact["role"]
+                or (exact["wm_type"] and win.get_wm_type() in exact["wm_type"])):
+            return True
+
+        if self._memo_rules:
+            hit = self._memo.get(key)
+            if hit is None:
+                hit = any(win.match(rule) for rule in self._memo_rules)
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[key] = hit
+            if hit:
+                return True
+
+        return any(win.match(rule) for rule in self._other_rules)
+
+    def _record(self, win):
+        wm_class, title, role = _window_key(win)
+        event = dict(
+            wm_class=list(wm_class), title=title, role=role,
+            wm_type=win.get_wm_type(), transient=bool(win.is_transient_for()),
+            # for the func rules in Floating.default_float_rules
+            fixed_size=win.has_fixed_size(), fixed_ratio=win.has_fixed_ratio(),
+        )
+        try:
+            os.makedirs(os.path.dirname(self.record), exist_ok=True)
+            with open(self.record, "a") as f:
+                f.write(json.dumps(event) + "\n")
+        except OSError:
+            self.record = None
+
+
+class ReplayWindow:
+    """
+    Just enough of a window for Match.compare() to work on a recorded event.
+    """
+
+    def __init__(self, event):
+        self.event = event
+        self.name = event.get("title", "")
+        self.wid = 0
+        self.group = None
+
+    def get_wm_class(self):
+        return self.event.get("wm_class") or None
+
+    def get_wm_role(self):
+        return self.event.get("role") or None
+
+    def get_wm_type(self):
+        return self.event.get("wm_type")
+
+    def get_pid(self):
+        return 0
+
+    def has_fixed_size(self):
+        return bool(self.event.get("fixed_size"))
+
+    def has_fixed_ratio(self):
+        return bool(self.event.get("fixed_ratio"))
+
+    def is_transient_for(self):
+        return self if self.event.get("transient") else None
+
+    def match(self, rule):
+        return rule.compare(self)
+
+
+def benchmark(path=DEFAULT_RECORD, floating=None, rounds=100):
+    """
+    Replay recorded window-creation events against the stock linear scan and
+    the index; returns µs per window for both.
+    """
+    if floating is None:
+        from libqtile import qtile
+        floating = qtile.config.floating_layout
+    if not isinstance(floating, IndexedFloating):
+        floating = IndexedFloating(float_rules=floating.float_rules)
+    floating.record = None
+
+    with open(os.path.expanduser(path)) as f:
+        windows = [ReplayWindow(json.loads(line)) for line in f if line.strip()]
+    if not windows:
+        return {}
+
+    result = {}
+    for name, match in (("linear", lambda w: layout.Floating.match(floating, w)),
+                        ("indexed", floating.match)):
+        floating._memo.clear()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for win in windows:
+                match(win)
+        result[name + "_us_per_window"] = round(
+            (time.perf_counter() - start) * 1e6 / (rounds * len(windows)), 2
+        )
+    result["windows"] = len(windows)
+    result["mismatches"] = sum(
+        layout.Floating.match(floating, w) != floating.match(w) for w in windows
+    )
+    return result
+
+
+if __name__ == "__main__":
+    print(benchmark(
+        sys.argv[1] if len(sys.argv) > 1 else DEFAULT_RECORD,
+        floating=IndexedFloating(float_rules=layout.Floating.default_float_rules),
+    ))
@@ -1,7 +1,9 @@
 #!/usr/bin/env bash
-# pick a random .jpg/.png from your lock folder
-IMG="$(find ~/Pictures/wallpapers -type f \( -iname '*.jpg' -o -iname '*.png' \) | shuf -n1)"
-# if none found, go black
+# take a ready, screen-sized PNG from the lock pool (see wallpapers.py)
+IMG="$(python3 ~/.config/qtile/wallpapers.py lock-pick)"
+# convert a replacement in the background, i3lock has its image by then
+(nice -n 19 python3 ~/.config/qtile/wallpapers.py lock-fill > /dev/null 2>&1 &)
+# empty pool (or no screen size): lock on plain black
 if [[ -z "$IMG" ]]; then
   exec i3lock --color=000000 --nofork --show-failed-attempts --ignore-empty-password
 else
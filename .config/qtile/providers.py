@@ -0,0 +1,179 @@
+# Shared data providers for the status bars.
+#
+# init_widgets() runs once per monitor, so stock Net/Memory/CPU widgets would
+# each poll psutil on their own timer. Here every metric has exactly one
+# sampler on one timer, and the result is pushed to all subscribed widgets.
+
+import time
+from math import log
+
+import psutil
+from libqtile import qtile
+from libqtile.utils import logger
+from libqtile.widget import base
+
+from bar_scheduler import ScheduledDraw
+
+
+class Provider:
+    """
+    Runs `sample()` every `update_interval` seconds (in qtile's executor, like
+    ThreadPoolText does) while at least one widget is subscribed.
+    """
+
+    def __init__(self, sample, update_interval):
+        self.sample = sample
+        self.update_interval = update_interval
+        self.subscribers = []
+        self.value = None
+        self._timer = None
+
+    def subscribe(self, widget):
+        self.subscribers.append(widget)
+        if self.value is not None:
+            widget.push(self.value)
+        if self._timer is None:
+            self._tick()
+
+    def unsubscribe(self, widget):
+        if widget in self.subscribers:
+            self.subscribers.remove(widget)
+        if not self.subscribers and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _tick(self):
+        self._timer = qtile.call_later(self.update_interval, self._tick)
+        future = qtile.run_in_executor(self.sample)
+        future.add_done_callback(self._publish)
+
+    def _publish(self, future):
+        try:
+            self.value = future.result()
+        except Exception:
+            logger.exception(f"{self.sample!r} failed")
+            return
+        for widget in list(self.subscribers):
+            widget.push(self.value)
+
+
+def _human(num_bytes):
+    """
+    Same scaling as widget.Net: (value, suffix) in powers of 1024.
+    """
+    letters = ["", "k", "M", "G", "T", "P"]
+    power = min(int(log(num_bytes, 1024)), len(letters) - 1) if num_bytes >= 1 else 0
+    return num_bytes / 1024**power, letters[power] + "B"
+
+
+class NetSampler:
+    """
+    Throughput over all interfaces since the previous sample, in the keys
+    widget.Net offers to its `format`.
+    """
+
+    def __init__(self):
+        self._last = None
+
+    def __call__(self):
+        now = time.monotonic()
+        io = psutil.net_io_counters()
+        if self._last is None:
+            down = up = 0.0
+        else:
+            then, last = self._last
+            elapsed = max(now - then, 1e-6)
+            down = (io.bytes_recv - last.bytes_recv) / elapsed
+            up = (io.bytes_sent - last.bytes_sent) / elapsed
+        self._last = (now, io)
+
+        down, down_suffix = _human(down)
+        up, up_suffix = _human(up)
+        total, total_suffix = _human(down + up)
+        return dict(
+            down=down, down_suffix=down_suffix,
+            up=up, up_suffix=up_suffix,
+            total=total, total_suffix=total_suffix,
+        )
+
+
+class MemorySampler:
+    """
+    The keys widget.Memory offers, scaled to `measure_mem` (K/M/G).
+    """
+
+    def __init__(self, measure_mem="M"):
+        self.calc_mem = 1024 ** {"K": 1, "M": 2, "G": 3}[measure_mem]
+
+    def __call__(self):
+        mem = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        return dict(
+            MemUsed=mem.used / self.calc_mem,
+            MemTotal=mem.total / self.calc_mem,
+            MemFree=mem.free / self.calc_mem,
+            MemPercent=mem.percent,
+            SwapUsed=swap.used / self.calc_mem,
+            SwapTotal=swap.total / self.calc_mem,
+            SwapPercent=swap.percent,
+        )
+
+
+def cpu_sample():
+    """
+    The keys widget.CPU offers.
+    """
+    freq = psutil.cpu_freq()
+    return dict(
+        load_percent=round(psutil.cpu_percent(), 1),
+        freq_current=round(freq.current / 1000, 1) if freq else 0,
+        freq_max=round(freq.max / 1000, 1) if freq else 0,
+        freq_min=round(freq.min / 1000, 1) if freq else 0,
+    )
+
+
+def _shared(name, make):
+    """
+    One provider per metric for the life of the qtile process. reload_config
+    re-imports this module, so they are kept on the qtile object; the old
+    bars unsubscribe in finalize() and the new ones subscribe again.
+    """
+    providers = getattr(qtile, "_bar_providers", None)
+    if providers is None:
+        providers = qtile._bar_providers = {}
+    if name not in providers:
+        providers[name] = make()
+    return providers[name]
+
+
+# One provider per metric, shared by every bar.
+net = _shared("net", lambda: Provider(NetSampler(), update_interval=3))
+memory = _shared("memory", lambda: Provider(MemorySampler(measure_mem="G"), update_interval=2))
+cpu = _shared("cpu", lambda: Provider(cpu_sample, update_interval=2))
+
+
+class ProviderText(ScheduledDraw, base._TextBox):
+    """
+    Text widget that renders the latest sample of a shared Provider instead
+    of polling on its own. Its redraws go through the frame scheduler.
+    """
+
+    defaults = [
+        ("format", "{}", "Format string, filled with the provider's sample"),
+    ]
+
+    def __init__(self, provider, **config):
+        base._TextBox.__init__(self, "", **config)
+        self.add_defaults(ProviderText.defaults)
+        self.provider = provider
+
+    def _configure(self, qtile, bar):
+        base._TextBox._configure(self, qtile, bar)
+        self.provider.subscribe(self)
+
+    def push(self, value):
+        self.update(self.format.format(**value))
+
+    def finalize(self):
+        self.provider.unsubscribe(self)
+        base._TextBox.finalize(self)
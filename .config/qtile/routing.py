@@ -0,0 +1,110 @@
+# Window → group routing.
+#
+# Rules are compiled once, at config load, into one lookup structure per
+# window property: a dict for exact matches, a longest-first tuple for
+# prefixes and a single alternation regex for everything else.
+
+import re
+from collections import namedtuple
+
+Route = namedtuple("Route", "group switch")
+
+FIELDS = ("wm_class", "role", "title")
+
+
+class prefix(str):
+    """
+    Marks a rule value as a prefix match: wm_class=prefix("libreoffice").
+    """
+
+
+def rule(group, switch=False, **match):
+    """
+    `match` takes one or more of wm_class/role/title. A plain string is an
+    exact match, prefix("...") a prefix match and re.compile("...") a regex.
+    """
+    unknown = set(match) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown match field(s): {', '.join(sorted(unknown))}")
+    return match, Route(group, switch)
+
+
+class RoutingTable:
+    def __init__(self, rules):
+        exact = {field: {} for field in FIELDS}
+        prefixes = {field: [] for field in FIELDS}
+        regexes = {field: [] for field in FIELDS}
+
+        for match, route in rules:
+            for field, value in match.items():
+                if isinstance(value, re.Pattern):
+                    regexes[field].append((value, route))
+                elif isinstance(value, prefix):
+                    prefixes[field].append((str(value), route))
+                else:
+                    # first rule wins, like a linear scan would
+                    exact[field].setdefault(value, route)
+
+        self._exact = exact
+        # longest prefix first so the most specific rule wins
+        self._prefixes = {
+            field: tuple(sorted(items, key=lambda i: -len(i[0])))
+            for field, items in prefixes.items()
+        }
+        self._regexes = {
+            field: self._combine(items) for field, items in regexes.items()
+        }
+        # only ask X for the properties some rule actually looks at
+        self.fields = tuple(
+            field for field in FIELDS
+            if exact[field] or prefixes[field] or regexes[field]
+        )
+
+    @staticmethod
+    def _combine(items):
+        """
+        One alternation with a named group per rule; `lastgroup` tells which
+        rule matched. IGNORECASE is kept per rule through scoped flags.
+        """
+        if not items:
+            return None
+        parts = []
+        for i, (pattern, _) in enumerate(items):
+            scope = "(?i:%s)" if pattern.flags & re.IGNORECASE else "(?:%s)"
+            parts.append(f"(?P<r{i}>{scope % pattern.pattern})")
+        return re.compile("|".join(parts)), [route for _, route in items]
+
+    def lookup(self, field, values):
+        """
+        Route for the first of `values` matching a `field` rule, or None.
+        Exact matches beat prefixes, prefixes beat regexes.
+        """
+        exact = self._exact[field]
+        for value in values:
+            if value in exact:
+                return exact[value]
+        for value in values:
+            for start, route in self._prefixes[field]:
+                if value.startswith(start):
+                    return route
+        combined = self._regexes[field]
+        if combined:
+            regex, routes = combined
+            for value in values:
+                found = regex.search(value)
+                if found:
+                    return routes[int(found.lastgroup[1:])]
+        return None
+
+    def route(self, client):
+        for field in self.fields:
+            if field == "wm_class":
+                values = client.get_wm_class() or ()
+            elif field == "role":
+                values = (client.get_wm_role() or "",)
+            else:
+                values = (client.name or "",)
+            found = self.lookup(field, [v for v in values if v])
+            if found:
+                return found
+        return None
@@ -0,0 +1,155 @@
+# Screen topology service.
+#
+# Replaces the old `xrandr --query` probe: connected outputs are read once
+# through the X connection qtile already holds, cached per connector/EDID and
+# only re-read when qtile fires `screen_change` (see config.py). reload_config
+# re-imports every module in the config directory, so the cache lives on the
+# qtile object instead of in this module, and reloads hit it.
+
+import hashlib
+import os
+import subprocess
+import time
+from collections import namedtuple
+
+from libqtile import qtile
+from libqtile.utils import logger
+
+Output = namedtuple("Output", "connector edid x y width height")
+
+
+class _State:
+    def __init__(self):
+        # { (connector, edid_hash): Output } of the currently connected outputs
+        self.outputs = {}
+        self.stale = True
+        # how long the last probe took, in milliseconds, and what it used
+        self.probe_ms = 0.0
+        self.probe_source = None
+
+
+def _state():
+    """
+    The cache, created on first use and kept on the qtile object.
+    """
+    state = getattr(qtile, "_screen_topology", None)
+    if state is None:
+        state = _State()
+        qtile._screen_topology = state
+    return state
+
+
+def _edid_hash(ext, output):
+    """
+    Short, stable hash of the EDID blob of an output ("" if it has none).
+    """
+    import xcffib.xproto
+
+    atom = qtile.core.conn.conn.core.InternAtom(True, len("EDID"), "EDID").reply().atom
+    if not atom:
+        return ""
+    prop = ext.GetOutputProperty(
+        output, atom, xcffib.xproto.GetPropertyType.Any, 0, 256, False, False
+    ).reply()
+    if not prop.num_items:
+        return ""
+    return hashlib.sha1(bytes(prop.data)).hexdigest()[:12]
+
+
+def _probe_randr():
+    """
+    Query RandR over qtile's own X connection. No fork, no full reprobe:
+    GetScreenResourcesCurrent only returns what the server already knows.
+    """
+    import xcffib.randr
+
+    conn = qtile.core.conn
+    ext = conn.conn(xcffib.randr.key)
+    root = conn.default_screen.root.wid
+    res = ext.GetScreenResourcesCurrent(root).reply()
+
+    outputs = {}
+    for output in res.outputs:
+        info = ext.GetOutputInfo(output, res.config_timestamp).reply()
+        if info.connection != xcffib.randr.Connection.Connected or not info.crtc:
+            continue
+        crtc = ext.GetCrtcInfo(info.crtc, res.config_timestamp).reply()
+        connector = bytes(info.name).decode(errors="replace")
+        edid = _edid_hash(ext, output)
+        outputs[(connector, edid)] = Output(
+            connector, edid, crtc.x, crtc.y, crtc.width, crtc.height
+        )
+    return outputs
+
+
+def _probe_core():
+    """
+    Backend-agnostic fallback (Wayland, or X without RandR).
+    """
+    outputs = {}
+    for i, (x, y, width, height) in enumerate(qtile.core.get_screen_info()):
+        connector = f"screen-{i}"
+        outputs[(connector, "")] = Output(connector, "", x, y, width, height)
+    return outputs
+
+
+def _probe_xrandr():
+    """
+    The old way, kept only so the two can be timed against each other:
+    QTILE_TOPOLOGY_PROBE=xrandr qtile start
+    """
+    output = subprocess.check_output(["xrandr", "--query"]).decode()
+    outputs = {}
+    for line in output.splitlines():
+        if " connected" in line:
+            connector = line.split()[0]
+            outputs[(connector, "")] = Output(connector, "", 0, 0, 0, 0)
+    return outputs
+
+
+def _probe():
+    if os.environ.get("QTILE_TOPOLOGY_PROBE") == "xrandr":
+        return "xrandr", _probe_xrandr()
+    if qtile.core.name == "x11":
+        try:
+            return "randr", _probe_randr()
+        except Exception:
+            logger.exception("RandR probe failed, falling back to core screen info")
+    try:
+        return "core", _probe_core()
+    except Exception:
+        logger.exception("Core screen info failed, assuming a single monitor")
+        return "default", {("default", ""): Output("default", "", 0, 0, 0, 0)}
+
+
+def refresh():
+    """
+    Re-read the topology and replace the cache. Returns True if the set of
+    connected outputs changed.
+    """
+    state = _state()
+    start = time.perf_counter()
+    source, found = _probe()
+    state.probe_ms = (time.perf_counter() - start) * 1000
+    state.probe_source = source
+    logger.info(f"Monitor detection ({source}) took {state.probe_ms:.2f} ms")
+
+    changed = found.keys() != state.outputs.keys()
+    state.outputs = found
+    state.stale = False
+    return changed
+
+
+def outputs():
+    """
+    Connected outputs ordered left-to-right, top-to-bottom, like qtile's
+    own screen order.
+    """
+    state = _state()
+    if state.stale:
+        refresh()
+    return sorted(state.outputs.values(), key=lambda o: (o.x, o.y))
+
+
+def monitor_count():
+    return max(1, len(outputs()))
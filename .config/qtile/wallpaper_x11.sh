@@ -0,0 +1,28 @@
+#!/usr/bin/env bash
+# wallpaper service, supervised by autostart.py
+
+# indexed catalogue of ~/Pictures/wallpapers, see wallpapers.py
+WALLPAPERS=~/.config/qtile/wallpapers.py
+
+feh_random() {
+  # pick up added/removed wallpapers (only re-lists changed directories)
+  python3 "$WALLPAPERS" update > /dev/null
+
+  # random image, already scaled to the monitor size
+  local file
+  file=$(python3 "$WALLPAPERS" pick --size monitor) || return
+
+  # set it as your background (fill mode)
+  feh --bg-fill "$file"
+
+  # keep the lock-screen pool topped up (and resized after monitor changes)
+  nice -n 19 python3 "$WALLPAPERS" lock-fill > /dev/null &
+}
+
+# initial wallpaper
+feh_random
+
+# every 300 seconds (5m), pick & set a new one
+while sleep 300; do
+  feh_random
+done
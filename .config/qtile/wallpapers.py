@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# Wallpaper catalogue for wallpaper_x11.sh and lock_with_random_bg_x11.sh.
+#
+# Instead of `find ~/Pictures/wallpapers ... | shuf -n1` on every change/lock,
+# the image paths live in a compact on-disk index that is updated
+# incrementally (only directories whose mtime changed are re-listed) and can
+# pick a random entry in O(1) without reading the whole list. Picked images
+# are pre-scaled once per screen size and cached as PNG.
+#
+#   wallpapers.py update                  refresh the index
+#   wallpapers.py pick [--size SIZE]      random image, scaled to SIZE
+#   wallpapers.py lock-fill               top up the lock-screen pool
+#   wallpapers.py lock-pick               take a ready lock image from the pool
+#
+# SIZE is "monitor" (largest connected monitor), "root" (all monitors
+# combined) or WxH. Standard library only; scaling uses ImageMagick if present.
+#
+# The lock pool is a handful of PNGs already at the combined resolution, so
+# lock_with_random_bg_x11.sh never decodes or scales anything: lock-pick
+# renames one ready file to current.png, and lock-fill (run in the background
+# at login and after every lock) converts a replacement. With the pool empty
+# lock-pick prints nothing and the script locks on a plain colour. Pick times
+# are appended to lock.log.
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+from array import array
+
+WALLPAPER_DIR = os.path.expanduser("~/Pictures/wallpapers")
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "wallpapers"
+)
+EXTENSIONS = (".jpg", ".jpeg", ".png")
+SCALED_PER_SIZE = 64  # scaled copies kept per screen size
+LOCK_DIR = os.path.join(CACHE_DIR, "lock")
+LOCK_POOL = 4         # ready lock images kept at the current root size
+LOCK_LOG = os.path.join(CACHE_DIR, "lock.log")
+
+PATHS = os.path.join(CACHE_DIR, "index.paths")      # NUL-separated paths
+OFFSETS = os.path.join(CACHE_DIR, "index.offsets")  # uint64 start of each path
+DIRS = os.path.join(CACHE_DIR, "index.dirs.json")   # {dir: [mtime_ns, subdirs, files]}
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# ── index ─────────────────────────────────────────────────────────────────
+def _load_dirs():
+    try:
+        with open(DIRS) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _scan(path):
+    subdirs, files = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+            elif entry.name.lower().endswith(EXTENSIONS) and entry.is_file():
+                files.append(entry.name)
+    return sorted(subdirs), sorted(files)
+
+
+def update(root=WALLPAPER_DIR):
+    """
+    Re-list only directories whose mtime changed since the last update.
+    Returns the number of indexed images.
+    """
+    old = _load_dirs()
+    new = {}
+    changed = False
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            changed = True
+            continue
+        known = old.get(path)
+        if known and known[0] == mtime:
+            entry = known
+        else:
+            try:
+                subdirs, files = _scan(path)
+            except OSError:
+                changed = True
+                continue
+            entry = [mtime, subdirs, files]
+            changed = True
+        new[path] = entry
+        stack.extend(os.path.join(path, d) for d in reversed(entry[1]))
+    changed = changed or new.keys() != old.keys()
+
+    if not changed and os.path.exists(OFFSETS):
+        return os.path.getsize(OFFSETS) // 8
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    blob = bytearray()
+    offsets = array("Q")
+    for path in sorted(new):
+        for name in new[path][2]:
+            offsets.append(len(blob))
+            blob += os.fsencode(os.path.join(path, name)) + b"\0"
+    _write_atomic(PATHS, bytes(blob))
+    _write_atomic(OFFSETS, offsets.tobytes())
+    _write_atomic(DIRS, json.dumps(new).encode())
+    return len(offsets)
+
+
+def random_path():
+    """
+    O(1): one random offset, one short read. None if the index is empty.
+    """
+    try:
+        count = os.path.getsize(OFFSETS) // 8
+    except OSError:
+        count = 0
+    if not count:
+        count = update()
+        if not count:
+            return None
+    i = random.randrange(count)
+    with open(OFFSETS, "rb") as f:
+        f.seek(i * 8)
+        start = array("Q", f.read(8))[0]
+    with open(PATHS, "rb") as f:
+        f.seek(start)
+        chunk = b""
+        while b"\0" not in chunk:
+            data = f.read(4096)
+            if not data:
+                break
+            chunk += data
+    return os.fsdecode(chunk.split(b"\0", 1)[0])
+
+
+# ── scaling ───────────────────────────────────────────────────────────────
+def screen_size(spec):
+    """
+    "WxH", or the size of the "root" window / largest "monitor" as reported
+    by `xrandr --current` (no reprobe of the outputs).
+    """
+    if re.fullmatch(r"\d+x\d+", spec):
+        return spec
+    try:
+        output = subprocess.check_output(["xrandr", "--current"], text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    if spec == "root":
+        found = re.search(r"current (\d+) x (\d+)", output)
+        return f"{found[1]}x{found[2]}" if found else None
+    sizes = [(int(w), int(h)) for w, h in
+             re.findall(r" connected (?:primary )?(\d+)x(\d+)\+", output)]
+    if not sizes:
+        return None
+    w, h = max(sizes, key=lambda s: s[0] * s[1])
+    return f"{w}x{h}"
+
+
+def _convert_cmd():
+    for tool in ("magick", "convert"):
+        if shutil.which(tool):
+            return [tool]
+    return None
+
+
+def scaled(path, size):
+    """
+    PNG copy of `path` filled/cropped to `size`, converted once and cached.
+    Falls back to the original if ImageMagick is not installed.
+    """
+    convert = _convert_cmd()
+    if not convert or not size:
+        return path
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return path
+    size_dir = os.path.join(CACHE_DIR, size)
+    key = hashlib.sha1(os.fsencode(f"{path}:{mtime}")).hexdigest()
+    target = os.path.join(size_dir, key + ".png")
+    if os.path.exists(target):
+        os.utime(target)
+        return target
+
+    os.makedirs(size_dir, exist_ok=True)
+    if not _convert(convert, path, target, size):
+        return path
+    _prune(size_dir)
+    return target
+
+
+def _convert(convert, path, target, size):
+    """
+    Fill/crop `path` to `size` and write it to `target` as PNG, atomically.
+    """
+    tmp = f"{target}.{os.getpid()}.tmp"
+    result = subprocess.run(
+        convert + [path, "-resize", size + "^", "-gravity", "center",
+                   "-extent", size, "PNG:" + tmp],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    if result.returncode:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        return False
+    os.replace(tmp, target)
+    return True
+
+
+def _prune(size_dir, keep=SCALED_PER_SIZE):
+    entries = sorted(os.scandir(size_dir), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[keep:]:
+        os.unlink(entry.path)
+
+
+# ── lock pool ─────────────────────────────────────────────────────────────
+def _pool(size):
+    pool_dir = os.path.join(LOCK_DIR, size)
+    try:
+        ready = [n for n in os.listdir(pool_dir)
+                 if n.endswith(".png") and n != "current.png"]
+    except OSError:
+        ready = []
+    return pool_dir, ready
+
+
+def lock_fill(size, pool=LOCK_POOL):
+    """
+    Convert random wallpapers into the pool until `pool` are ready. Pools
+    for other sizes (old monitor setups) are dropped. Only one fill runs at
+    a time; returns the number of images converted.
+    """
+    convert = _convert_cmd()
+    if not convert or not size:
+        return 0
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    with open(os.path.join(LOCK_DIR, ".fill.lock"), "w") as lockfile:
+        try:
+            fcntl.flock(lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return 0
+        for name in os.listdir(LOCK_DIR):
+            if name != size and not name.startswith("."):
+                shutil.rmtree(os.path.join(LOCK_DIR, name), ignore_errors=True)
+
+        pool_dir, ready = _pool(size)
+        os.makedirs(pool_dir, exist_ok=True)
+        converted = 0
+        for _ in range(pool * 3):  # give up on unreadable images eventually
+            if len(ready) >= pool:
+                break
+            path = random_path()
+            if not path:
+                break
+            name = hashlib.sha1(os.fsencode(path)).hexdigest() + ".png"
+            if name in ready:
+                continue
+            if _convert(convert, path, os.path.join(pool_dir, name), size):
+                ready.append(name)
+                converted += 1
+        return converted
+
+
+def lock_pick(size):
+    """
+    Move one ready pool image to current.png and return it. Never converts;
+    None if the pool is empty (anything else might not be a PNG at `size`).
+    """
+    start = time.perf_counter()
+    pool_dir, ready = _pool(size)
+    if ready:
+        path = os.path.join(pool_dir, "current.png")
+        os.replace(os.path.join(pool_dir, random.choice(ready)), path)
+        source = "pool"
+    else:
+        path = None
+        source = "empty"
+    _log_pick(source, (time.perf_counter() - start) * 1000)
+    return path
+
+
+def _log_pick(source, elapsed_ms):
+    try:
+        if os.path.getsize(LOCK_LOG) > 64 * 1024:
+            os.unlink(LOCK_LOG)
+    except OSError:
+        pass
+    try:
+        with open(LOCK_LOG, "a") as f:
+            f.write(f"{time.strftime('%F %T')} {source} {elapsed_ms:.1f} ms\n")
+    except OSError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexed wallpaper catalogue")
+    parser.add_argument("command", choices=("update", "pick", "lock-fill", "lock-pick"))
+    parser.add_argument("--size", help='"monitor", "root" or WxH')
+    args = parser.parse_args(argv)
+
+    if args.command == "update":
+        print(update())
+        return 0
+
+    if args.command.startswith("lock-"):
+        size = screen_size(args.size or "root")
+        if args.command == "lock-fill":
+            print(lock_fill(size))
+            return 0
+        path = lock_pick(size) if size else None
+        if not path:
+            return 1
+        print(path)
+        return 0
+
+    size = screen_size(args.size) if args.size else None
+    path = random_path()
+    if path and not os.path.exists(path):
+        update()
+        path = random_path()
+    if path and size:
+        path = scaled(path, size)
+    if not path:
+        return 1
+    print(path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
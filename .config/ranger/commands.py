@@ -91,12 +91,22 @@
 
 from __future__ import (absolute_import, division, print_function)
 
-from collections import deque
 import os
 import re
 
 from ranger.api.commands import Command
 
+from commands_ext.bookmarks import BookmarkPaths, prefix_join
+from commands_ext.boundaries import TypeBoundaries
+from commands_ext.deleter import delete_in_background
+from commands_ext.dirindex import DirIndex
+from commands_ext.scoutcache import NameFilter, ScoutCache
+from commands_ext.search import GrepJob
+from commands_ext.sizeprobe import SizeProbe, has_entries
+from commands_ext.tagindex import TagIndex, mark_batch
+from commands_ext.trash import TrashIndex, TrashJob, restore
+from commands_ext import copybuffer, matchers, renamer
+
 
 class alias(Command):
     """:alias <newcommand> <oldcommand>
@@ -134,6 +144,12 @@ class cd(Command):
     Using the option "-r" will get you to the real path.
     """
 
+    # Shared by all cd instances (one is created per keypress): subdirectory
+    # names per parent path, re-listed only when the parent's mtime changes.
+    dir_index = DirIndex()
+    # Sorted bookmark paths for the cd_bookmarks prefix join.
+    bookmark_paths = BookmarkPaths()
+
     def execute(self):
         if self.arg(1) == '-r':
             self.shift()
@@ -172,40 +188,41 @@ class cd(Command):
         return (start, dest_exp, os.path.join(self.fm.thisdir.path, dest_exp),
                 dest.endswith(os.path.sep))
 
-    @staticmethod
-    def _tab_paths(dest, dest_abs, ends_with_sep):
+    def _tab_paths(self, dest, dest_abs, ends_with_sep):
         if not dest:
             try:
-                return next(os.walk(dest_abs))[1], dest_abs
-            except (OSError, StopIteration):
+                return list(self.dir_index.subdirs(dest_abs)), dest_abs
+            except OSError:
                 return [], ''
 
         if ends_with_sep:
             try:
-                return [os.path.join(dest, path) for path in next(os.walk(dest_abs))[1]], ''
-            except (OSError, StopIteration):
+                return [os.path.join(dest, path) for path in self.dir_index.subdirs(dest_abs)], ''
+            except OSError:
                 return [], ''
 
         return None, None
 
-    def _tab_match(self, path_user, path_file):
-        if self.fm.settings.cd_tab_case == 'insensitive':
-            path_user = path_user.lower()
-            path_file = path_file.lower()
-        elif self.fm.settings.cd_tab_case == 'smart' and path_user.islower():
-            path_file = path_file.lower()
-        return path_file.startswith(path_user)
+    def _tab_folded(self, path_user):
+        case = self.fm.settings.cd_tab_case
+        return case == 'insensitive' or (case == 'smart' and path_user.islower())
+
+    def _tab_match(self, path_user, parent):
+        """Subdirectories of parent that start with path_user (per cd_tab_case)"""
+        if self._tab_folded(path_user):
+            return self.dir_index.prefixed(parent, path_user.lower(), folded=True)
+        return self.dir_index.prefixed(parent, path_user)
 
     def _tab_normal(self, dest, dest_abs):
         dest_dir = os.path.dirname(dest)
         dest_base = os.path.basename(dest)
 
         try:
-            dirnames = next(os.walk(os.path.dirname(dest_abs)))[1]
-        except (OSError, StopIteration):
+            dirnames = self._tab_match(dest_base, os.path.dirname(dest_abs))
+        except OSError:
             return [], ''
 
-        return [os.path.join(dest_dir, d) for d in dirnames if self._tab_match(dest_base, d)], ''
+        return [os.path.join(dest_dir, d) for d in dirnames], ''
 
     def _tab_fuzzy_match(self, basepath, tokens):
         """ Find directories matching tokens recursively """
@@ -217,11 +234,10 @@ class cd(Command):
             matches = []
             for path in paths:
                 try:
-                    directories = next(os.walk(path))[1]
-                except (OSError, StopIteration):
+                    directories = self._tab_match(token, path)
+                except OSError:
                     continue
-                matches += [os.path.join(path, d) for d in directories
-                            if self._tab_match(token, d)]
+                matches += [os.path.join(path, d) for d in directories]
             if not tokens or not matches:
                 return matches
             paths = matches
@@ -265,10 +281,12 @@ class cd(Command):
         paths.sort()
 
         if self.fm.settings.cd_bookmarks:
+            bookmarks = self.bookmark_paths.update(
+                v.path for v in self.fm.bookmarks.dct.values())
+            prefixes = [os.path.join(paths_rel, path) + sep for path in paths]
             paths[0:0] = [
-                os.path.relpath(v.path, paths_rel) if paths_rel else v.path
-                for v in self.fm.bookmarks.dct.values() for path in paths
-                if v.path.startswith(os.path.join(paths_rel, path) + sep)
+                os.path.relpath(path, paths_rel) if paths_rel else path
+                for path in prefix_join(bookmarks, prefixes)
             ]
 
         if not paths:
@@ -656,21 +674,22 @@ class delete(Command):
 
     When attempting to delete non-empty directories or multiple
     marked files, it will require a confirmation.
+
+    Deletion runs in the background with its progress in the status bar;
+    remove the task in the task view to cancel it.
     """
 
     allow_abbrev = False
     escape_macros_for_shell = True
+    # Count entries/bytes of the selection into the confirmation prompt
+    probe_size = True
 
     def execute(self):
         import shlex
-        from functools import partial
-
-        def is_directory_with_files(path):
-            return os.path.isdir(path) and not os.path.islink(path) and len(os.listdir(path)) > 0
 
         if self.rest(1):
             files = shlex.split(self.rest(1))
-            many_files = (len(files) > 1 or is_directory_with_files(files[0]))
+            many_files = (len(files) > 1 or has_entries(files[0]))
         else:
             cwd = self.fm.thisdir
             tfile = self.fm.thisfile
@@ -680,32 +699,50 @@ class delete(Command):
 
             # relative_path used for a user-friendly output in the confirmation.
             files = [f.relative_path for f in self.fm.thistab.get_selection()]
-            many_files = (cwd.marked_items or is_directory_with_files(tfile.path))
+            many_files = (cwd.marked_items or has_entries(tfile.path))
 
         confirm = self.fm.settings.confirm_on_delete
         if confirm != 'never' and (confirm != 'multiple' or many_files):
-            self.fm.ui.console.ask(
-                "Confirm deletion of: %s (y/N)" % ', '.join(files),
-                partial(self._question_callback, files),
-                ('n', 'N', 'y', 'Y'),
-            )
+            self._ask(files)
         else:
             # no need for a confirmation, just delete
-            self.fm.delete(files)
+            self._delete(files)
 
     def tab(self, tabnum):
         return self._tab_directory_content()
 
-    def _question_callback(self, files, answer):
+    def _ask(self, files):
+        from functools import partial
+
+        head = "Confirm deletion of: %s" % ', '.join(files)
+        probe = None
+        if self.probe_size:
+            paths = [os.path.join(self.fm.thisdir.path, f) for f in files]
+            probe = SizeProbe(self.fm, paths, head)
+        self.fm.ui.console.ask(
+            head + " (y/N)",
+            partial(self._question_callback, files, probe),
+            ('n', 'N', 'y', 'Y'),
+        )
+        if probe:
+            probe.start()
+
+    def _question_callback(self, files, probe, answer):
+        if probe:
+            probe.cancel()
         if answer == 'y' or answer == 'Y':
-            self.fm.delete(files)
+            self._delete(files)
+
+    def _delete(self, files):
+        delete_in_background(self.fm, files)
 
 
-class trash(Command):
+class trash(delete):
     """:trash
 
     Tries to move the selection or the files passed in arguments (if any) to
-    the trash, using rifle rules with label "trash".
+    the FreeDesktop.org trash, in-process and in the background (see
+    commands_ext/trash.py).
     The arguments use a shell-like escaping.
 
     "Selection" is defined as all the "marked files" (by default, you
@@ -716,47 +753,60 @@ class trash(Command):
     marked files, it will require a confirmation.
     """
 
-    allow_abbrev = False
-    escape_macros_for_shell = True
+    def _delete(self, files):
+        paths = [os.path.join(self.fm.thisdir.path, f) for f in files]
+        self.fm.loader.add(TrashJob(self.fm, paths))
+
+
+class trash_list(Command):
+    """:trash_list [<filter>]
+
+    Shows the trashed items, most recent first, in the pager.
+    Only items whose original path contains <filter> are listed.
+    """
 
     def execute(self):
-        import shlex
-        from functools import partial
+        needle = self.rest(1)
+        lines = ['%s  %s' % (entry.deleted.replace('T', ' '), entry.original)
+                 for entry in trash_restore.index.entries()
+                 if needle in entry.original]
+        pager = self.fm.ui.open_pager()
+        pager.set_source(['Trash (%d items):' % len(lines)] + lines)
 
-        def is_directory_with_files(path):
-            return os.path.isdir(path) and not os.path.islink(path) and len(os.listdir(path)) > 0
 
-        if self.rest(1):
-            files = shlex.split(self.rest(1))
-            many_files = (len(files) > 1 or is_directory_with_files(files[0]))
-        else:
-            cwd = self.fm.thisdir
-            tfile = self.fm.thisfile
-            if not cwd or not tfile:
-                self.fm.notify("Error: no file selected for deletion!", bad=True)
-                return
+class trash_restore(Command):
+    """:trash_restore [<original path>]
 
-            # relative_path used for a user-friendly output in the confirmation.
-            files = [f.relative_path for f in self.fm.thistab.get_selection()]
-            many_files = (cwd.marked_items or is_directory_with_files(tfile.path))
+    Restores the most recently trashed item with the given original path,
+    or the most recently trashed item at all if no path is given.
+    """
 
-        confirm = self.fm.settings.confirm_on_delete
-        if confirm != 'never' and (confirm != 'multiple' or many_files):
-            self.fm.ui.console.ask(
-                "Confirm deletion of: %s (y/N)" % ', '.join(files),
-                partial(self._question_callback, files),
-                ('n', 'N', 'y', 'Y'),
-            )
+    # Shared index of the trash directories, re-read when they change.
+    index = TrashIndex()
+
+    def execute(self):
+        if self.rest(1):
+            entry = self.index.find(os.path.join(self.fm.thisdir.path,
+                                                 os.path.expanduser(self.rest(1))))
         else:
-            # no need for a confirmation, just delete
-            self.fm.execute_file(files, label='trash')
+            entries = self.index.entries()
+            entry = entries[0] if entries else None
+        if entry is None:
+            self.fm.notify('Nothing to restore', bad=True)
+            return
+        try:
+            restore(entry)
+        except OSError as err:
+            self.fm.notify('Cannot restore %s: %s' % (entry.original, err), bad=True)
+            return
+        self.fm.notify('Restored %s' % entry.original)
+        self.fm.thisdir.content_outdated = True
 
     def tab(self, tabnum):
-        return self._tab_directory_content()
-
-    def _question_callback(self, files, answer):
-        if answer == 'y' or answer == 'Y':
-            self.fm.execute_file(files, label='trash')
+        start = self.rest(1)
+        return sorted(set(self.start(1) + entry.original
+                          for entry in self.index.entries()
+                          if entry.original.startswith(start)))
 
 
 class jump_non(Command):
@@ -775,31 +825,15 @@ class jump_non(Command):
         self._flag_reverse = 'r' in flags
         self._flag_wrap = 'w' in flags
 
-    @staticmethod
-    def _non(fobj, is_directory):
-        return fobj.is_directory if not is_directory else not fobj.is_directory
+    # Shared by all invocations; see commands_ext/boundaries.py.
+    boundaries = TypeBoundaries()
 
     def execute(self):
-        tfile = self.fm.thisfile
-        passed = False
-        found_before = None
-        found_after = None
-        for fobj in self.fm.thisdir.files[::-1] if self._flag_reverse else self.fm.thisdir.files:
-            if fobj.path == tfile.path:
-                passed = True
-                continue
-
-            if passed:
-                if self._non(fobj, tfile.is_directory):
-                    found_after = fobj.path
-                    break
-            elif not found_before and self._non(fobj, tfile.is_directory):
-                found_before = fobj.path
-
-        if found_after:
-            self.fm.select_file(found_after)
-        elif self._flag_wrap and found_before:
-            self.fm.select_file(found_before)
+        cwd = self.fm.thisdir
+        target = self.boundaries.target(cwd, cwd.pointer,
+                                        reverse=self._flag_reverse, wrap=self._flag_wrap)
+        if target is not None:
+            self.fm.move(to=target)
 
 
 class mark_tag(Command):
@@ -809,19 +843,15 @@ class mark_tag(Command):
     When leaving out the tag argument, all tagged files are marked.
     """
     do_mark = True
+    # Shared with unmark_tag; see commands_ext/tagindex.py.
+    index = TagIndex()
 
     def execute(self):
         cwd = self.fm.thisdir
         tags = self.rest(1).replace(" ", "")
         if not self.fm.tags or not cwd.files:
             return
-        for fileobj in cwd.files:
-            try:
-                tag = self.fm.tags.tags[fileobj.realpath]
-            except KeyError:
-                continue
-            if not tags or tag in tags:
-                cwd.mark_item(fileobj, val=self.do_mark)
+        mark_batch(cwd, self.index.tagged(self.fm.tags.tags, cwd, tags), self.do_mark)
         self.fm.ui.status.need_redraw = True
         self.fm.ui.need_redraw = True
 
@@ -848,25 +878,24 @@ class load_copy_buffer(Command):
     """:load_copy_buffer
 
     Load the copy buffer from datadir/copy_buffer
+
+    The paths are checked for existence in the background afterwards.
     """
     copy_buffer_filename = 'copy_buffer'
 
     def execute(self):
-        import sys
         from ranger.container.file import File
-        from os.path import exists
         fname = self.fm.datapath(self.copy_buffer_filename)
-        unreadable = IOError if sys.version_info[0] < 3 else OSError
         try:
-            fobj = open(fname, 'r')
-        except unreadable:
+            paths = copybuffer.read(fname)
+        except OSError:
             return self.fm.notify(
                 "Cannot open %s" % (fname or self.copy_buffer_filename), bad=True)
 
-        self.fm.copy_buffer = set(File(g)
-                                  for g in fobj.read().split("\n") if exists(g))
-        fobj.close()
+        self.fm.copy_buffer = set(File(g) for g in paths)
         self.fm.ui.redraw_main_column()
+        if self.fm.copy_buffer:
+            self.fm.loader.add(copybuffer.ValidateJob(self.fm, self.fm.copy_buffer))
         return None
 
 
@@ -874,21 +903,19 @@ class save_copy_buffer(Command):
     """:save_copy_buffer
 
     Save the copy buffer to datadir/copy_buffer
+
+    The file is replaced atomically, or only appended to if paths were just
+    added since the last save.
     """
     copy_buffer_filename = 'copy_buffer'
 
     def execute(self):
-        import sys
-        fname = None
         fname = self.fm.datapath(self.copy_buffer_filename)
-        unwritable = IOError if sys.version_info[0] < 3 else OSError
         try:
-            fobj = open(fname, 'w')
-        except unwritable:
+            copybuffer.save(fname, (fobj.path for fobj in self.fm.copy_buffer))
+        except OSError:
             return self.fm.notify("Cannot open %s" %
                                   (fname or self.copy_buffer_filename), bad=True)
-        fobj.write("\n".join(fobj.path for fobj in self.fm.copy_buffer))
-        fobj.close()
         return None
 
 
@@ -1114,23 +1141,24 @@ class chmod(Command):
 
 
 class bulkrename(Command):
-    """:bulkrename
+    """:bulkrename [-n]
 
     This command opens a list of selected files in an external editor.
-    After you edit and save the file, it will generate a shell script
-    which does bulk renaming according to the changes you did in the file.
+    After you edit and save the file, the files are renamed according to the
+    changes you did in the file.  Swaps and cycles (a -> b, b -> a) work, new
+    directories are created as needed, and tags move with their files.
 
-    This shell script is opened in an editor for you to review.
-    After you close it, it will be executed.
+    With -n nothing is renamed; the planned renames are shown in the pager.
+    The last bulk rename can be reverted with :bulkrename_undo.
     """
+    journal_filename = 'bulkrename_journal'
 
     def execute(self):
-        # pylint: disable=too-many-locals,too-many-statements,too-many-branches
         import sys
         import tempfile
         from ranger.container.file import File
-        from ranger.ext.shell_escape import shell_escape as esc
         py3 = sys.version_info[0] >= 3
+        flags, _ = self.parse_flags()
 
         # Create and edit the file list
         filenames = [f.relative_path for f in self.fm.thistab.get_selection()]
@@ -1146,63 +1174,69 @@ class bulkrename(Command):
               py3 else open(listpath, 'r')) as listfile:
             new_filenames = listfile.read().split("\n")
         os.unlink(listpath)
-        if all(a == b for a, b in zip(filenames, new_filenames)):
+
+        cwd = self.fm.thisdir.path
+        pairs = [(os.path.join(cwd, old), os.path.normpath(os.path.join(cwd, new)))
+                 for old, new in zip(filenames, new_filenames) if new and old != new]
+        if not pairs:
             self.fm.notify("No renaming to be done!")
             return
+        try:
+            ops = renamer.plan(pairs)
+        except renamer.PlanError as err:
+            problems = err.args[0]
+            self.fm.notify("Nothing renamed, %d conflict(s) (first: %s)"
+                           % (len(problems), problems[0]), bad=True)
+            return
 
-        # Generate script
-        with tempfile.NamedTemporaryFile() as cmdfile:
-            script_lines = []
-            script_lines.append("# This file will be executed when you close"
-                                " the editor.")
-            script_lines.append("# Please double-check everything, clear the"
-                                " file to abort.")
-            new_dirs = []
-            for old, new in zip(filenames, new_filenames):
-                if old != new:
-                    basepath, _ = os.path.split(new)
-                    if (basepath and basepath not in new_dirs
-                            and not os.path.isdir(basepath)):
-                        script_lines.append("mkdir -vp -- {dir}".format(
-                            dir=esc(basepath)))
-                        new_dirs.append(basepath)
-                    script_lines.append("mv -vi -- {old} {new}".format(
-                        old=esc(old), new=esc(new)))
-            # Make sure not to forget the ending newline
-            script_content = "\n".join(script_lines) + "\n"
-            if py3:
-                cmdfile.write(script_content.encode(encoding="utf-8",
-                                                    errors="surrogateescape"))
+        if 'n' in flags:
+            pager = self.fm.ui.open_pager()
+            pager.set_source(["Planned renames (%d):" % len(ops)]
+                             + ["%s -> %s" % (os.path.relpath(src, cwd), os.path.relpath(dst, cwd))
+                                for src, dst in ops])
+            return
+        self._apply(ops)
+
+    def _apply(self, ops, undo=False):
+        try:
+            renamer.apply(ops)
+        except OSError as err:
+            self.fm.notify("Nothing renamed: %s" % err, bad=True)
+            return
+        moves = renamer.final_moves(ops)
+        renamer.retag(self.fm.tags, moves)
+        journal = self.fm.datapath(self.journal_filename)
+        try:
+            if undo:
+                os.unlink(journal)
             else:
-                cmdfile.write(script_content)
-            cmdfile.flush()
-
-            # Open the script and let the user review it, then check if the
-            # script was modified by the user
-            self.fm.execute_file([File(cmdfile.name)], app='editor')
-            cmdfile.seek(0)
-            script_was_edited = (script_content != cmdfile.read())
-
-            # Do the renaming
-            self.fm.run(['/bin/sh', cmdfile.name], flags='w')
-
-        # Retag the files, but only if the script wasn't changed during review,
-        # because only then we know which are the source and destination files.
-        if not script_was_edited:
-            tags_changed = False
-            for old, new in zip(filenames, new_filenames):
-                if old != new:
-                    oldpath = self.fm.thisdir.path + '/' + old
-                    newpath = self.fm.thisdir.path + '/' + new
-                    if oldpath in self.fm.tags:
-                        old_tag = self.fm.tags.tags[oldpath]
-                        self.fm.tags.remove(oldpath)
-                        self.fm.tags.tags[newpath] = old_tag
-                        tags_changed = True
-            if tags_changed:
-                self.fm.tags.dump()
-        else:
-            fm.notify("files have not been retagged")
+                renamer.write_journal(journal, ops)
+        except OSError:
+            pass
+        self.fm.notify("%s %d file(s)" % ("Restored" if undo else "Renamed", len(moves)))
+        self.fm.thisdir.content_outdated = True
+
+
+class bulkrename_undo(bulkrename):
+    """:bulkrename_undo
+
+    Reverts the last :bulkrename.
+    """
+
+    def execute(self):
+        try:
+            ops = renamer.read_journal(self.fm.datapath(self.journal_filename))
+        except (OSError, ValueError):
+            self.fm.notify("No bulk rename to undo", bad=True)
+            return
+        try:
+            undo = renamer.plan((dst, src) for src, dst in renamer.final_moves(ops))
+        except renamer.PlanError as err:
+            problems = err.args[0]
+            self.fm.notify("Cannot undo, %d conflict(s) (first: %s)"
+                           % (len(problems), problems[0]), bad=True)
+            return
+        self._apply(undo, undo=True)
 
 
 class relink(Command):
@@ -1475,6 +1509,12 @@ class scout(Command):
     INVERT        = 'v'
     # pylint: enable=bad-whitespace
 
+    # Flags that change what a pattern matches
+    MATCH_FLAGS = SM_GLOB + IGNORE_CASE + SM_LETTERSKIP + SM_REGEX + SMART_CASE + INVERT
+
+    # Shared by all scout invocations; see commands_ext/scoutcache.py.
+    match_cache = ScoutCache()
+
     def __init__(self, *args, **kwargs):
         super(scout, self).__init__(*args, **kwargs)
         self._regex = None
@@ -1496,8 +1536,13 @@ class scout(Command):
                 for fobj in thisdir.files:
                     thisdir.mark_item(fobj, value)
             else:
+                names = self._matches()
+                if names is None:
+                    search = regex.search
+                else:
+                    search = set(names).__contains__
                 for fobj in thisdir.files:
-                    if regex.search(fobj.relative_path):
+                    if search(fobj.relative_path):
                         thisdir.mark_item(fobj, value)
 
         if self.PERM_FILTER in flags:
@@ -1532,7 +1577,7 @@ class scout(Command):
     def quick(self):
         asyoutype = self.AS_YOU_TYPE in self.flags
         if self.FILTER in self.flags:
-            self.fm.thisdir.temporary_filter = self._build_regex()
+            self.fm.thisdir.temporary_filter = self._temporary_filter()
         if self.PERM_FILTER in self.flags and asyoutype:
             self.fm.thisdir.filter = self._build_regex()
         if self.FILTER in self.flags or self.PERM_FILTER in self.flags:
@@ -1545,55 +1590,40 @@ class scout(Command):
         self._count(move=True, offset=tabnum)
 
     def _build_regex(self):
-        if self._regex is not None:
-            return self._regex
-
-        frmat = "%s"
-        flags = self.flags
-        pattern = self.pattern
-
-        if pattern == ".":
-            return re.compile("")
-
-        # Handle carets at start and dollar signs at end separately
-        if pattern.startswith('^'):
-            pattern = pattern[1:]
-            frmat = "^" + frmat
-        if pattern.endswith('$'):
-            pattern = pattern[:-1]
-            frmat += "$"
-
-        # Apply one of the search methods
-        if self.SM_REGEX in flags:
-            regex = pattern
-        elif self.SM_GLOB in flags:
-            regex = re.escape(pattern).replace("\\*", ".*").replace("\\?", ".")
-        elif self.SM_LETTERSKIP in flags:
-            regex = ".*".join(re.escape(c) for c in pattern)
-        else:
-            regex = re.escape(pattern)
-
-        regex = frmat % regex
-
-        # Invert regular expression if necessary
-        if self.INVERT in flags:
-            regex = "^(?:(?!%s).)*$" % regex
-
-        # Compile Regular Expression
-        # pylint: disable=no-member
-        options = re.UNICODE
-        if self.IGNORE_CASE in flags or self.SMART_CASE in flags and \
-                pattern.islower():
-            options |= re.IGNORECASE
-        # pylint: enable=no-member
-        try:
-            self._regex = re.compile(regex, options)
-        except re.error:
-            self._regex = re.compile("")
+        if self._regex is None:
+            # shared LRU across scout invocations; see commands_ext/matchers.py
+            flags, pattern = self._key()
+            self._regex = matchers.matcher(pattern, flags)
         return self._regex
 
+    def _key(self):
+        return ''.join(sorted(set(self.flags) & set(self.MATCH_FLAGS))), self.pattern
+
+    def _narrows(self, old_key):
+        """Whether everything the current pattern matches is also matched by
+        the pattern of old_key, i.e. the pattern was only extended."""
+        old_flags, old_pattern = old_key
+        flags, pattern = self._key()
+        if old_flags != flags or self.SM_REGEX in flags or self.INVERT in flags:
+            return False
+        # a trailing $ is an anchor, but not once something follows it
+        return pattern.startswith(old_pattern) and not old_pattern.endswith('$')
+
+    def _matches(self):
+        """Relative paths in thisdir matching the pattern, or None if the
+        directory is not loaded."""
+        return self.match_cache.matches(self.fm.thisdir, self._key(),
+                                        self._build_regex(), self._narrows)
+
+    def _temporary_filter(self):
+        cwd = self.fm.thisdir
+        names = None if cwd.flat else self._matches()
+        if names is None:
+            return self._build_regex()
+        # relative_path is the basename, which is what filters look at
+        return NameFilter(names, self._build_regex().pattern)
+
     def _count(self, move=False, offset=0):
-        count = 0
         cwd = self.fm.thisdir
         pattern = self.pattern
 
@@ -1604,21 +1634,14 @@ class scout(Command):
         if pattern == '..':
             return 1
 
-        deq = deque(cwd.files)
-        deq.rotate(-cwd.pointer - offset)
-        i = offset
-        regex = self._build_regex()
-        for fsobj in deq:
-            if regex.search(fsobj.relative_path):
-                count += 1
-                if move and count == 1:
-                    cwd.move(to=(cwd.pointer + i) % len(cwd.files))
-                    self.fm.thisfile = cwd.pointed_obj
-            if count > 1:
-                return count
-            i += 1
-
-        return count == 1
+        # only -f needs every match (see quick()); otherwise stop at the second
+        names = self.match_cache.cached(cwd, self._key())
+        found = self.match_cache.first_two(cwd, names, self._build_regex().search,
+                                           cwd.pointer + offset)
+        if move and found:
+            cwd.move(to=found[0])
+            self.fm.thisfile = cwd.pointed_obj
+        return len(found)
 
 
 class narrow(Command):
@@ -1713,17 +1736,58 @@ class filter_stack(Command):
 
 
 class grep(Command):
-    """:grep <string>
+    """:grep <pattern>
 
-    Looks for a string in all marked files or directories
+    Looks for a pattern (a Python regular expression) in all marked files or
+    directories.  Results appear in the pager while the search runs; files
+    hidden by hidden_filter are skipped unless show_hidden is set.  Use
+    :grep_jump to go to a match.
     """
 
     def execute(self):
         if self.rest(1):
-            action = ['grep', '--line-number']
-            action.extend(['-e', self.rest(1), '-r'])
-            action.extend(f.path for f in self.fm.thistab.get_selection())
-            self.fm.execute_command(action, flags='p')
+            if GrepJob.latest is not None:
+                self.fm.loader.remove(item=GrepJob.latest)
+            settings = self.fm.settings
+            job = GrepJob(self.fm, [f.path for f in self.fm.thistab.get_selection()],
+                          self.rest(1),
+                          hidden_filter=None if settings.show_hidden else settings.hidden_filter)
+            GrepJob.latest = job
+            self.fm.ui.open_pager().set_source(job.lines)
+            self.fm.loader.add(job)
+
+
+class grep_jump(Command):
+    """:grep_jump [<n>|next|prev]
+
+    Selects the file of a :grep match: the n-th one, the next or previous
+    one, or, in the pager, the match on the top line.
+    """
+
+    def execute(self):
+        job = GrepJob.latest
+        if job is None or not job.matches:
+            self.fm.notify("No grep matches", bad=True)
+            return
+        arg = self.arg(1)
+        pager = self.fm.ui.pager
+        if arg.isdigit():
+            index = int(arg) - 1
+        elif pager.visible and pager.source is job.lines:
+            index = max(pager.scroll_begin - 1, 0)
+        elif job.current is None:
+            index = -1 if arg == 'prev' else 0
+        else:
+            index = job.current + (-1 if arg == 'prev' else 1)
+        index %= len(job.matches)
+        job.current = index
+
+        path, lineno = job.matches[index]
+        if pager.visible:
+            self.fm.ui.close_pager()
+        self.fm.select_file(path)
+        if lineno is not None:
+            self.fm.notify("Match %d/%d: line %d" % (index + 1, len(job.matches), lineno))
 
 
 class flat(Command):
@@ -1755,10 +1819,16 @@ class flat(Command):
 class reset_previews(Command):
     """:reset_previews
 
-    Reset the file previews.
+    Reset the previews of files that changed since they were made (all of
+    them if the preview script changed).
     """
     def execute(self):
-        self.fm.previews = {}
+        # installed by plugins/preview_pool.py; see commands_ext/previews.py
+        service = getattr(self.fm, 'preview_service', None)
+        if service is None:
+            self.fm.previews = {}
+        else:
+            service.reset()
         self.fm.ui.need_redraw = True
 
 
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+# Helpers for commands.py that are too large to live in it.
+#
+# ranger puts the config directory on sys.path while it imports commands.py,
+# so import from this package at the top of commands.py (submodules imported
+# lazily later still resolve through the package's own __path__).
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Prefix join of bookmark paths against :cd completion candidates.
+
+The old join compared every bookmark with every candidate.  Here the
+bookmark paths are kept sorted and deduplicated, so each candidate costs one
+binary search plus its actual hits: O(candidates * log(bookmarks)).
+
+Benchmark against the nested-loop version:
+    python -m commands_ext.bookmarks [candidates] [bookmarks]
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from bisect import bisect_left
+
+
+class BookmarkPaths(object):
+    """Sorted, deduplicated bookmark paths, rebuilt only when they change."""
+
+    def __init__(self):
+        self._signature = None
+        self.paths = []
+
+    def update(self, paths):
+        signature = tuple(paths)
+        if signature != self._signature:
+            self._signature = signature
+            self.paths = sorted(set(signature))
+        return self.paths
+
+
+def prefix_join(sorted_paths, prefixes):
+    """Paths from sorted_paths that start with any of prefixes, in prefix
+    order, each path at most once."""
+    seen = set()
+    result = []
+    for prefix in prefixes:
+        i = bisect_left(sorted_paths, prefix)
+        while i < len(sorted_paths) and sorted_paths[i].startswith(prefix):
+            path = sorted_paths[i]
+            if path not in seen:
+                seen.add(path)
+                result.append(path)
+            i += 1
+    return result
+
+
+def _nested_loop_join(paths, prefixes):
+    return [path for path in paths for prefix in prefixes if path.startswith(prefix)]
+
+
+def benchmark(n_candidates=5000, n_bookmarks=500, rounds=5):
+    import random
+    import timeit
+
+    rng = random.Random(0)
+    base = '/home/user/projects'
+    candidates = sorted('dir%05d' % i for i in range(n_candidates))
+    prefixes = [os.path.join(base, c) + os.sep for c in candidates]
+    bookmarks = [os.path.join(base, rng.choice(candidates), 'sub%d' % rng.randrange(5))
+                 for _ in range(n_bookmarks)]
+    sorted_paths = BookmarkPaths().update(bookmarks)
+
+    assert (sorted(prefix_join(sorted_paths, prefixes))
+            == sorted(set(_nested_loop_join(bookmarks, prefixes))))
+    naive = min(timeit.repeat(lambda: _nested_loop_join(bookmarks, prefixes),
+                              number=1, repeat=rounds))
+    fast = min(timeit.repeat(lambda: prefix_join(sorted_paths, prefixes),
+                             number=1, repeat=rounds))
+    print('%d candidates x %d bookmarks: nested loop %.2f ms, bisect %.2f ms'
+          % (n_candidates, n_bookmarks, naive * 1000, fast * 1000))
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Positions where a directory listing switches between directories and files.
+
+:jump_non used to walk (and for -r copy) the whole file list, comparing paths
+to find the cursor.  With the positions of the type transitions at hand, the
+target is a binary search away from the pointer.  The positions are computed
+once per file list: ranger builds a new `files` list whenever a directory is
+reloaded, refiltered or resorted, so the list's identity is the cache key.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+from bisect import bisect_right
+from collections import OrderedDict
+
+
+class TypeBoundaries(object):
+    """Maps directory path -> (files list, transition positions), LRU-bounded.
+
+    A transition position i means files[i] and files[i - 1] differ in
+    is_directory.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def _boundaries(self, directory):
+        files = directory.files
+        entry = self._entries.get(directory.path)
+        if entry is not None and entry[0] is files:
+            self._entries.move_to_end(directory.path)
+            return entry[1]
+
+        boundaries = []
+        previous = None
+        for i, fobj in enumerate(files):
+            is_dir = fobj.is_directory
+            if i and is_dir != previous:
+                boundaries.append(i)
+            previous = is_dir
+
+        # keeping a reference to the list keeps its id from being reused
+        self._entries[directory.path] = (files, boundaries)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return boundaries
+
+    def target(self, directory, pointer, reverse=False, wrap=False):
+        """Index of the next entry (from pointer, in the given direction) whose
+        type differs from the entry at pointer, or None."""
+        files = directory.files
+        if not files or not 0 <= pointer < len(files):
+            return None
+        boundaries = self._boundaries(directory)
+        if not boundaries:
+            return None
+        is_dir = files[pointer].is_directory
+
+        if not reverse:
+            i = bisect_right(boundaries, pointer)
+            if i < len(boundaries):
+                return boundaries[i]
+            if not wrap:
+                return None
+            return 0 if files[0].is_directory != is_dir else boundaries[0]
+
+        i = bisect_right(boundaries, pointer) - 1
+        if i >= 0:
+            return boundaries[i] - 1
+        if not wrap:
+            return None
+        last = len(files) - 1
+        return last if files[last].is_directory != is_dir else boundaries[-1] - 1
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
+
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""On-disk copy buffer for :load_copy_buffer and :save_copy_buffer.
+
+The old file was the paths joined by newlines: a file name containing a
+newline broke it, a crash halfway through a save left a truncated buffer, and
+loading stat()ed every path before the buffer could be used.
+
+Format (version 1): the 6-byte magic b'RCBUF\\x01', then one record per path,
+a big-endian uint32 length followed by the fsencoded path.  A save writes a
+temporary file and renames it over the old one; when only paths were added
+since our last save they are appended instead.  A torn append leaves an
+incomplete last record, which the reader ignores.  Old newline files are still
+read.
+
+Loading builds the File objects right away and checks that the paths exist
+in a background batch afterwards; missing ones are dropped from the buffer
+when that finishes.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import struct
+import threading
+import time
+
+from ranger.core.loader import Loadable
+
+MAGIC = b'RCBUF\x01'
+_LENGTH = struct.Struct('>I')
+
+# (filename, st_size, st_mtime_ns, paths) after our last write, so a save
+# can tell whether appending is enough.
+_last_saved = None
+
+
+def _record(path):
+    data = os.fsencode(path)
+    return _LENGTH.pack(len(data)) + data
+
+
+def read(fname):
+    """Paths in the buffer file, in file order.  Raises OSError."""
+    with open(fname, 'rb') as fobj:
+        data = fobj.read()
+    if not data.startswith(MAGIC):
+        # pre-versioned format: newline-separated paths
+        return [os.fsdecode(line) for line in data.split(b'\n') if line]
+
+    paths = []
+    offset = len(MAGIC)
+    end = len(data)
+    while offset + _LENGTH.size <= end:
+        length, = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        if offset + length > end:
+            break  # torn append
+        paths.append(os.fsdecode(data[offset:offset + length]))
+        offset += length
+    return paths
+
+
+def _remember(fname, paths):
+    global _last_saved  # pylint: disable=global-statement
+    stat = os.stat(fname)
+    _last_saved = (fname, stat.st_size, stat.st_mtime_ns, frozenset(paths))
+
+
+def write(fname, paths):
+    """Atomically replace the buffer file.  Raises OSError."""
+    paths = list(paths)
+    tmp = '%s.%d.tmp' % (fname, os.getpid())
+    try:
+        with open(tmp, 'wb') as fobj:
+            fobj.write(MAGIC + b''.join(_record(path) for path in paths))
+            fobj.flush()
+            os.fsync(fobj.fileno())
+        os.rename(tmp, fname)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    _remember(fname, paths)
+
+
+def append(fname, paths):
+    """Append paths to an existing version 1 buffer file.  Raises OSError."""
+    paths = list(paths)
+    with open(fname, 'ab') as fobj:
+        fobj.write(b''.join(_record(path) for path in paths))
+        fobj.flush()
+        os.fsync(fobj.fileno())
+    if _last_saved is not None and _last_saved[0] == fname:
+        paths = _last_saved[3].union(paths)
+    _remember(fname, paths)
+
+
+def save(fname, paths):
+    """Write paths, appending when the file still holds exactly what we last
+    saved and nothing was removed since.  Returns the number of records
+    written."""
+    paths = set(paths)
+    if _last_saved is not None and _last_saved[0] == fname:
+        _, size, mtime, saved = _last_saved
+        try:
+            stat = os.stat(fname)
+            unchanged = stat.st_size == size and stat.st_mtime_ns == mtime
+        except OSError:
+            unchanged = False
+        if unchanged and saved <= paths:
+            added = paths - saved
+            if added:
+                append(fname, sorted(added))
+            return len(added)
+    write(fname, sorted(paths))
+    return len(paths)
+
+
+class ValidateJob(Loadable):
+    """Checks copy buffer entries for existence on a worker thread and drops
+    the missing ones from fm.copy_buffer."""
+
+    batch_size = 1024
+
+    def __init__(self, fm, files):
+        self.fm = fm
+        self.files = list(files)
+        self.checked = 0
+        self.missing = []
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._check)
+        self._thread.daemon = True
+        self._thread.start()
+        Loadable.__init__(self, self._generate(), 'Checking copy buffer')
+
+    def _check(self):
+        exists = os.path.lexists
+        for start in range(0, len(self.files), self.batch_size):
+            if self._cancel.is_set():
+                return
+            batch = self.files[start:start + self.batch_size]
+            self.missing.extend(fobj for fobj in batch if not exists(fobj.path))
+            self.checked = start + len(batch)
+
+    def _generate(self):
+        while self._thread.is_alive():
+            self.description = 'Checking copy buffer: %d/%d' % (self.checked, len(self.files))
+            self.percent = 100 * self.checked // max(len(self.files), 1)
+            yield
+        if self.missing and not self._cancel.is_set():
+            self.fm.copy_buffer.difference_update(self.missing)
+            self.fm.notify('Dropped %d missing path(s) from the copy buffer'
+                           % len(self.missing))
+            self.fm.ui.redraw_main_column()
+
+    def destroy(self):
+        self._cancel.set()
+        Loadable.destroy(self)
+
+
+def benchmark(count=50000):
+    """Save and load times of the old newline format and this one."""
+    import tempfile
+    tmpdir = tempfile.mkdtemp()
+    paths = ['/home/user/some/deeply/nested/project/dir/file_%06d.txt' % i
+             for i in range(count)]
+    result = {}
+    try:
+        old = os.path.join(tmpdir, 'old')
+        new = os.path.join(tmpdir, 'new')
+        start = time.time()
+        with open(old, 'w') as fobj:
+            fobj.write('\n'.join(paths))
+        result['save_newline'] = time.time() - start
+        start = time.time()
+        write(new, paths)
+        result['save_v1'] = time.time() - start
+        start = time.time()
+        save(new, paths + ['/one/more'])
+        result['append_one_v1'] = time.time() - start
+        start = time.time()
+        with open(old) as fobj:
+            [line for line in fobj.read().split('\n') if os.path.exists(line)]
+        result['load_newline_with_stat'] = time.time() - start
+        start = time.time()
+        read(new)
+        result['load_v1'] = time.time() - start
+    finally:
+        for name in os.listdir(tmpdir):
+            os.unlink(os.path.join(tmpdir, name))
+        os.rmdir(tmpdir)
+    return result
+
+
+if __name__ == '__main__':
+    for key, value in sorted(benchmark().items()):
+        print('%-24s %.4fs' % (key, value))
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Background deletion for :delete.
+
+fm.delete() removes everything with shutil.rmtree() on the UI thread, so a
+large node_modules freezes ranger until it is gone.  DeleteJob walks each
+top-level selection with os.scandir() on its own worker thread, unlinks in
+batches and removes directories bottom-up.  It is queued in ranger's loader,
+which shows its progress (files/s, bytes/s) in the status bar; removing it
+from the task view (:taskview_open, then dd) cancels it.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ranger.core.loader import Loadable
+from ranger.ext.human_readable import human_readable
+
+
+class DeleteJob(Loadable):
+    """Deletes paths on a thread pool, one walker per top-level path."""
+
+    max_workers = 4
+    batch_size = 256
+
+    def __init__(self, fm, paths):
+        self.fm = fm
+        self.paths = paths
+        # the listings to refresh at the end; the user may have moved on
+        self.parents = sorted(set(os.path.dirname(path) for path in paths))
+        self.files = 0
+        self.bytes = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._started = time.time()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, min(len(paths), self.max_workers)))
+        self._futures = [self._pool.submit(self._remove, path) for path in paths]
+        self._pool.shutdown(wait=False)
+        Loadable.__init__(self, self._generate(), 'Deleting %d item(s)' % len(paths))
+
+    # worker threads ------------------------------------------------------
+
+    def _count(self, files, size):
+        with self._lock:
+            self.files += files
+            self.bytes += size
+
+    def _error(self, err):
+        with self._lock:
+            self.errors.append(err)
+
+    def _unlink(self, entries):
+        files = size = 0
+        for entry in entries:
+            if self._cancel.is_set():
+                break
+            try:
+                entry_size = entry.stat(follow_symlinks=False).st_size
+                os.unlink(entry.path)
+            except OSError as err:
+                self._error(err)
+                continue
+            files += 1
+            size += entry_size
+        self._count(files, size)
+
+    def _remove(self, top):
+        try:
+            if os.path.islink(top) or not os.path.isdir(top):
+                size = os.lstat(top).st_size
+                os.unlink(top)
+                self._count(1, size)
+                return
+        except OSError as err:
+            self._error(err)
+            return
+
+        # Pre-order listing; reversed, every directory comes after its
+        # children, so rmdir() can run bottom-up afterwards.
+        stack = [top]
+        visited = []
+        while stack:
+            path = stack.pop()
+            visited.append(path)
+            batch = []
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if self._cancel.is_set():
+                            return
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            is_dir = False
+                        if is_dir:
+                            stack.append(entry.path)
+                        else:
+                            batch.append(entry)
+                            if len(batch) >= self.batch_size:
+                                self._unlink(batch)
+                                batch = []
+            except OSError as err:
+                self._error(err)
+            self._unlink(batch)
+
+        for path in reversed(visited):
+            if self._cancel.is_set():
+                return
+            try:
+                os.rmdir(path)
+            except OSError as err:
+                self._error(err)
+
+    # ranger main thread --------------------------------------------------
+
+    def _status(self):
+        elapsed = max(time.time() - self._started, 1e-6)
+        return 'Deleting: %d files, %.0f files/s, %s/s' % (
+            self.files, self.files / elapsed, human_readable(self.bytes / elapsed))
+
+    def _generate(self):
+        while not all(future.done() for future in self._futures):
+            self.description = self._status()
+            self.fm.ui.status.need_redraw = True
+            yield
+        self._finish()
+
+    def _finish(self):
+        elapsed = time.time() - self._started
+        if self._cancel.is_set():
+            self.fm.notify('Deletion cancelled after %d files' % self.files, bad=True)
+        elif self.errors:
+            self.fm.notify('Deleted %d files, %d errors (first: %s)'
+                           % (self.files, len(self.errors), self.errors[0]), bad=True)
+        else:
+            self.fm.notify('Deleted %d files (%s) in %.1fs'
+                           % (self.files, human_readable(self.bytes), elapsed))
+        for parent in self.parents:
+            self.fm.get_directory(parent).content_outdated = True
+        self.fm.thistab.ensure_correct_pointer()
+
+    def destroy(self):
+        # the loader drops the generator, so _finish() is up to us
+        self._cancel.set()
+        self._finish()
+        Loadable.destroy(self)
+
+
+def delete_in_background(fm, files):
+    """Like fm.delete(files), but returns immediately."""
+    paths = [os.path.join(fm.thisdir.path, f) for f in files]
+
+    # Same bookkeeping as fm.delete(): untag and forget in the copy buffer.
+    for tag in list(fm.tags.tags):
+        if any(str(tag).startswith(path) for path in paths):
+            fm.tags.remove(tag)
+    fm.copy_buffer = set(fobj for fobj in fm.copy_buffer if fobj.path not in paths)
+
+    job = DeleteJob(fm, paths)
+    fm.loader.add(job)
+    return job
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Lazily filled, mtime-invalidated index of subdirectory names.
+
+Used by :cd tab completion instead of calling os.walk() for every path
+component on every <TAB>.  Each parent directory costs one stat() per lookup
+and a directory listing only when its mtime changed.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class DirIndex(object):
+    """Maps parent path -> sorted subdirectory names, LRU-bounded."""
+
+    def __init__(self, maxsize=2048):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def _entry(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._entries.pop(path, None)
+            raise
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            self._entries.move_to_end(path)
+            return entry
+
+        # Like os.walk(): symlinks to directories count as directories.
+        names = []
+        with os.scandir(path) as it:
+            for dirent in it:
+                try:
+                    if dirent.is_dir():
+                        names.append(dirent.name)
+                except OSError:
+                    continue
+        names.sort()
+        folded = sorted((name.lower(), name) for name in names)
+        entry = (mtime, names, [f for f, _ in folded], [n for _, n in folded])
+
+        self._entries[path] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    def subdirs(self, path):
+        """All subdirectory names of path.  Raises OSError like os.scandir."""
+        return self._entry(path)[1]
+
+    def prefixed(self, path, prefix, folded=False):
+        """Subdirectory names of path starting with prefix.
+
+        With folded=True, prefix must be lower case and is compared against
+        the lower-cased names.  Uses a binary search on the sorted names.
+        """
+        _, names, folded_keys, folded_names = self._entry(path)
+        if folded:
+            keys, values = folded_keys, folded_names
+        else:
+            keys, values = names, names
+        if not prefix:
+            return list(values)
+        result = []
+        for i in range(bisect_left(keys, prefix), len(keys)):
+            if not keys[i].startswith(prefix):
+                break
+            result.append(values[i])
+        return result
+
+    def invalidate(self, path=None):
+        if path is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(path, None)
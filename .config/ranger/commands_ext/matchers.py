@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""Compiled :scout patterns, shared across invocations.
+
+ranger creates a new scout object for every console line, so the regex that
+scout used to cache on the instance was translated and compiled again on every
+keystroke.  matcher() is memoized on (pattern, flags) for the whole session.
+Patterns that come down to a plain string (the default mode, a glob without
+wildcards, a regex without metacharacters) get a Literal, which matches with
+str.find()/startswith()/endswith() instead of re.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import re
+from functools import lru_cache
+
+# The scout flags that change what a pattern matches (see :scout).
+SM_GLOB = 'g'
+IGNORE_CASE = 'i'
+SM_LETTERSKIP = 'l'
+SM_REGEX = 'r'
+SMART_CASE = 's'
+INVERT = 'v'
+
+
+class Literal(object):
+    """A plain-string pattern with the interface scout's users rely on:
+    .search(string) and .pattern (the equivalent regex, for display).
+
+    Ignoring case, text must be ASCII.  str.lower() only agrees with
+    re.IGNORECASE on ASCII strings (re also matches K to the Kelvin sign, s
+    to the long s, and str.lower() turns I with a dot into two characters),
+    so other strings go through the equivalent regex.
+    """
+
+    __slots__ = ('pattern', 'text', 'search', '_contains', '_ignore_case', '_regex')
+
+    def __init__(self, pattern, text, anchor_start, anchor_end, ignore_case):
+        self.pattern = pattern
+        self.text = text = text.lower() if ignore_case else text
+        self._contains = not anchor_start and not anchor_end
+        self._ignore_case = ignore_case
+        if anchor_start and anchor_end:
+            def test(string):
+                return string == text
+        elif anchor_start:
+            def test(string):
+                return string.startswith(text)
+        elif anchor_end:
+            def test(string):
+                return string.endswith(text)
+        else:
+            def test(string):
+                return text in string
+        if ignore_case:
+            self._regex = regex = re.compile(pattern, re.UNICODE | re.IGNORECASE).search
+
+            def search(string):
+                return test(string.lower()) if string.isascii() else regex(string)
+            self.search = search
+        else:
+            self._regex = None
+            self.search = test
+
+    def select(self, strings):
+        """The matching strings; the substring case avoids a call per string."""
+        text = self.text
+        if not self._contains:
+            return list(filter(self.search, strings))
+        if self._ignore_case:
+            regex = self._regex
+            return [string for string in strings
+                    if (text in string.lower() if string.isascii() else regex(string))]
+        return [string for string in strings if text in string]
+
+
+def _literal(pattern, flags):
+    """The plain text pattern stands for, or None if it needs re."""
+    if INVERT in flags:
+        return None
+    if SM_REGEX in flags:
+        return pattern if re.escape(pattern) == pattern else None
+    if SM_GLOB in flags:
+        return None if '*' in pattern or '?' in pattern else pattern
+    if SM_LETTERSKIP in flags:
+        return pattern if len(pattern) <= 1 else None
+    return pattern
+
+
+@lru_cache(maxsize=256)
+def matcher(pattern, flags):
+    """Compiled regex or Literal for a scout pattern; flags are scout's flag
+    letters (only the ones above matter, so callers should pass just those,
+    sorted, to share cache entries)."""
+    if pattern == ".":
+        return re.compile("")
+
+    frmat = "%s"
+    anchor_start = anchor_end = False
+    text = pattern
+
+    # Handle carets at start and dollar signs at end separately
+    if text.startswith('^'):
+        text = text[1:]
+        frmat = "^" + frmat
+        anchor_start = True
+    if text.endswith('$'):
+        text = text[:-1]
+        frmat += "$"
+        anchor_end = True
+
+    # Apply one of the search methods
+    if SM_REGEX in flags:
+        regex = text
+    elif SM_GLOB in flags:
+        regex = re.escape(text).replace("\\*", ".*").replace("\\?", ".")
+    elif SM_LETTERSKIP in flags:
+        regex = ".*".join(re.escape(c) for c in text)
+    else:
+        regex = re.escape(text)
+
+    regex = frmat % regex
+
+    # Invert regular expression if necessary
+    if INVERT in flags:
+        regex = "^(?:(?!%s).)*$" % regex
+
+    ignore_case = IGNORE_CASE in flags or SMART_CASE in flags and text.islower()
+
+    literal = _literal(text, flags)
+    if literal is not None and (literal.isascii() or not ignore_case):
+        return Literal(regex, literal, anchor_start, anchor_end, ignore_case)
+
+    # pylint: disable=no-member
+    options = re.UNICODE
+    if ignore_case:
+        options |= re.IGNORECASE
+    # pylint: enable=no-member
+    try:
+        return re.compile(regex, options)
+    except re.error:
+        return re.compile("")
@@ -0,0 +1,698 @@
+# -*- coding: utf-8 -*-
+"""scope.sh previews on a worker pool, with a persistent cache.
+
+ranger runs scope.sh through a CommandLoader for every file the cursor lands
+on, keeps the output only in fm.previews, and :reset_previews threw all of it
+away.  PreviewService replaces fm.get_preview (see plugins/preview_pool.py):
+
+* scope.sh runs on a bounded pool of worker threads.  A job for a file the
+  cursor has left is dropped from the queue or, if it is running, killed
+  together with the tools scope.sh started (it runs in its own session).
+* Results go to a size-bounded directory of marshal files, keyed by (path,
+  mtime, size, width) plus the scope.sh file and the preview_images setting,
+  so they survive restarts and a changed file simply misses.  Exit codes
+  whose output does not depend on the width are stored for any width, and
+  height is left out of the key: scope.sh does not use it.
+* reset() drops only the previews of files (or of a scope.sh) that changed
+  since the preview was made.
+* Once the cursor rests, Prefetcher makes the previews of the entries around
+  it on the pool at a lower priority, more of them ahead in the direction
+  the cursor was moving, and as many as the measured cost of a preview
+  allows.  One worker is kept free for the file under the cursor, and a
+  prefetch job for a file the cursor reaches is taken over instead of
+  started again.
+
+fm.previews keeps ranger's layout, so the parts of ranger that read it (the
+collapsing preview column, image previews) work as before.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import hashlib
+import heapq
+import itertools
+import marshal
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from stat import S_IEXEC
+from subprocess import DEVNULL, PIPE, Popen
+
+import ranger
+from ranger.core.loader import Loadable, safe_decode
+
+FORMAT = 1
+MAX_BYTES = 64 * 1024 * 1024  # on-disk cache size
+ANY = -1  # width of entries valid for any width
+# scope.sh exit codes whose result does not depend on the pane width
+ANY_WIDTH = (1, 2, 3, 5, 6, 7)
+# exit codes worth remembering; others (errors, kills) are run again next time
+CACHED = (0, 1, 2, 3, 4, 5, 6, 7)
+FOREGROUND = 0  # Job.priority of the file under the cursor
+PREFETCH = 1  # Job.priority of the nearest neighbour, +1 for each further one
+IDLE = 0.2  # seconds the cursor has to rest before neighbours are prefetched
+BUDGET = 2.0  # seconds of scope.sh time to spend on neighbours per rest
+MAX_NEIGHBOURS = 16
+
+
+def file_signature(path):
+    """(mtime_ns, size) of path, or None if it cannot be stat()ed."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class DiskCache(object):
+    """Directory of marshalled (rcode, content) results, one file per key,
+    least recently used evicted first once it grows past max_bytes."""
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._lock = threading.Lock()
+        self._entries = None  # name -> size, least recently used first
+        self._names = {}  # file path -> names of its entries seen this session
+
+    @staticmethod
+    def name(key):
+        return hashlib.sha1(repr(key).encode('utf-8', 'backslashreplace')).hexdigest()
+
+    def _index(self):
+        # with self._lock held; the directory is read once, on first use
+        if self._entries is None:
+            found = []
+            try:
+                with os.scandir(self.path) as it:
+                    for entry in it:
+                        if entry.name.endswith('.tmp'):
+                            continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        found.append((stat.st_mtime, entry.name, stat.st_size))
+            except OSError:
+                pass
+            found.sort()
+            self._entries = OrderedDict((name, size) for _, name, size in found)
+            self.total = sum(size for _, _, size in found)
+        return self._entries
+
+    def _seen(self, path, name):
+        self._names.setdefault(path, set()).add(name)
+
+    def get(self, key):
+        """(rcode, content) stored for key, or None."""
+        name = self.name(key)
+        fname = os.path.join(self.path, name)
+        try:
+            with open(fname, 'rb') as fobj:
+                stored = marshal.load(fobj)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(stored, tuple) or len(stored) != 4 \
+                or stored[0] != FORMAT or stored[1] != key:
+            return None
+        try:
+            os.utime(fname)  # keeps the LRU order across sessions
+        except OSError:
+            pass
+        with self._lock:
+            entries = self._index()
+            if name in entries:
+                entries.move_to_end(name)
+            self._seen(key[0], name)
+        return stored[2], stored[3]
+
+    def put(self, key, rcode, content):
+        data = marshal.dumps((FORMAT, key, rcode, content))
+        if len(data) > self.max_bytes // 16:
+            return False
+        name = self.name(key)
+        fname = os.path.join(self.path, name)
+        tmp = '%s.%d.%d.tmp' % (fname, os.getpid(), threading.get_ident())
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path)
+            with open(tmp, 'wb') as fobj:
+                fobj.write(data)
+            os.replace(tmp, fname)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return False
+        evicted = []
+        with self._lock:
+            entries = self._index()
+            self.total += len(data) - entries.pop(name, 0)
+            entries[name] = len(data)
+            self._seen(key[0], name)
+            while self.total > self.max_bytes and len(entries) > 1:
+                old, size = entries.popitem(last=False)
+                self.total -= size
+                evicted.append(old)
+        self._remove(evicted)
+        return True
+
+    def discard(self, path):
+        """Delete the entries for path that were read or written this
+        session; older ones are unreachable (their key has the old mtime and
+        size) and age out."""
+        with self._lock:
+            names = self._names.pop(path, ())
+            entries = self._index()
+            for name in names:
+                self.total -= entries.pop(name, 0)
+        self._remove(names)
+
+    def has(self, *keys):
+        """Whether there is an entry for one of keys, without reading it."""
+        return any(os.path.exists(os.path.join(self.path, self.name(key)))
+                   for key in keys)
+
+    def _remove(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+
+
+class Job(object):
+    __slots__ = ('path', 'args', 'key', 'width', 'cacheimg', 'priority',
+                 'process', 'cancelled', 'rcode', 'content')
+
+    def __init__(self, path, args, key, width, cacheimg, priority=FOREGROUND):
+        self.path = path
+        self.args = args
+        self.key = key
+        self.width = width
+        self.cacheimg = cacheimg
+        self.priority = priority
+        self.process = None
+        self.cancelled = False
+        self.rcode = None
+        self.content = None
+
+
+class PreviewPool(object):
+    """Runs scope.sh for queued Jobs on up to `workers` threads, lowest
+    priority first, and stores what they print in the DiskCache.  Finished
+    and cancelled jobs are put on `done` for the main thread.  Background
+    (prefetch) jobs get at most workers - 1 threads."""
+
+    def __init__(self, cache, workers):
+        self.cache = cache
+        self.workers = workers
+        self.done = deque()
+        self.wake = threading.Event()  # set whenever a job lands on done
+        self.cost = 0.25  # running average of seconds per scope.sh run
+        self._queue = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._running = set()
+        self._threads = 0
+        self._idle = 0
+        self._cond = threading.Condition()
+
+    def pending(self):
+        with self._cond:
+            return bool(self._queue or self._running or self.done)
+
+    def submit(self, job):
+        with self._cond:
+            heapq.heappush(self._queue, (job.priority, next(self._seq), job))
+            if not self._idle and self._threads < self.workers:
+                self._threads += 1
+                thread = threading.Thread(target=self._work, name='preview')
+                thread.daemon = True
+                thread.start()
+            self._cond.notify_all()
+
+    def has(self, path):
+        """Whether a job for path is queued or running."""
+        with self._cond:
+            return any(job.path == path for job in self._running) or \
+                any(item[2].path == path for item in self._queue)
+
+    def promote(self, path, key, width):
+        """Make a background job for the same preview a foreground one and
+        return it; None if there is none."""
+        with self._cond:
+            for job in itertools.chain(self._running, (item[2] for item in self._queue)):
+                if job.path == path and job.key == key and job.width == width \
+                        and not job.cancelled:
+                    job.priority = FOREGROUND
+                    self._queue = [(queued.priority, seq, queued)
+                                   for _, seq, queued in self._queue]
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+                    return job
+        return None
+
+    def cancel(self, keep=(), foreground=True, background=True, running=True):
+        """Cancel the queued and (with running) running jobs of the given
+        kinds, except those for the paths in keep."""
+        if not self.pending():
+            return
+
+        def doomed(job):
+            if job.path in keep:
+                return False
+            return foreground if job.priority == FOREGROUND else background
+        with self._cond:
+            queued = [item[2] for item in self._queue if doomed(item[2])]
+            if queued:
+                self._queue = [item for item in self._queue if not doomed(item[2])]
+                heapq.heapify(self._queue)
+            killed = [job for job in self._running if doomed(job)] if running else []
+            for job in queued + killed:
+                job.cancelled = True
+            processes = [job.process for job in killed if job.process is not None]
+        if queued:
+            self.done.extend(queued)
+            self.wake.set()
+        for process in processes:
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+
+    def _ready(self):
+        # with self._cond held
+        if not self._queue:
+            return False
+        if self._queue[0][2].priority == FOREGROUND:
+            return True
+        background = sum(1 for job in self._running if job.priority != FOREGROUND)
+        return background < self.workers - 1
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._ready():
+                    self._cond.wait()
+                self._idle -= 1
+                job = heapq.heappop(self._queue)[2]
+                self._running.add(job)
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running.discard(job)
+                    self.done.append(job)
+                    self._cond.notify_all()
+                self.wake.set()
+
+    def _run(self, job):
+        try:
+            process = Popen(job.args, stdin=DEVNULL, stdout=PIPE, stderr=DEVNULL,
+                            close_fds=True, start_new_session=True)
+        except OSError:
+            return
+        with self._cond:
+            job.process = process
+            cancelled = job.cancelled
+        if cancelled:
+            self._kill(process)
+        started = time.time()
+        output = process.communicate()[0]
+        job.rcode = process.returncode
+        if job.rcode < 0:
+            # killed; a half-written image would pass ranger's mtime check
+            try:
+                os.remove(job.cacheimg)
+            except OSError:
+                pass
+            return
+        self.cost += (time.time() - started - self.cost) * 0.3
+        if job.rcode in (0, 3, 4, 5):
+            job.content = safe_decode(output)
+        if job.rcode not in CACHED or job.rcode == 6 and not os.path.isfile(job.cacheimg):
+            return
+        width = ANY if job.rcode in ANY_WIDTH else job.width
+        self.cache.put(job.key + (width,), job.rcode, job.content)
+
+
+class Prefetcher(object):
+    """Queues background jobs for the neighbours of the cursor once it has
+    rested for IDLE seconds."""
+
+    def __init__(self, service):
+        self.service = service
+        self.due = None  # when to prefetch; None if nothing is planned
+        self.direction = 1
+        self.streak = 0  # moves in a row in self.direction
+        self._last = None  # (directory path, pointer) at the last move
+
+    def count(self):
+        """How many neighbours fit in BUDGET at the measured cost."""
+        cost = max(self.service.pool.cost, 0.001)
+        return max(1, min(MAX_NEIGHBOURS, int(BUDGET / cost)))
+
+    def window(self, files, pointer):
+        """Indices of the neighbours to prefetch, most likely next first:
+        after a run of moves one way nearly all lie that way, otherwise
+        they are split evenly, ahead first."""
+        count = self.count()
+        if self.streak >= 2:
+            ahead, behind = count - 1 or 1, 1 if count > 1 else 0
+        else:
+            ahead, behind = (count + 1) // 2, count // 2
+        order = []
+        for step in range(1, max(ahead, behind) + 1):
+            if step <= ahead:
+                order.append(pointer + step * self.direction)
+            if step <= behind:
+                order.append(pointer - step * self.direction)
+        return [i for i in order if 0 <= i < len(files)]
+
+    def _neighbours(self):
+        directory = self.service.fm.thisdir
+        if directory is None or not directory.files:
+            return []
+        files = directory.files
+        return [files[i] for i in self.window(files, directory.pointer)]
+
+    def on_move(self, signal):
+        fm = self.service.fm
+        if signal.tab is not fm.thistab or fm.thisdir is None:
+            return
+        here = (fm.thisdir.path, fm.thisdir.pointer)
+        if self._last is not None and self._last[0] == here[0]:
+            if here[1] != self._last[1]:
+                direction = 1 if here[1] > self._last[1] else -1
+                self.streak = self.streak + 1 if direction == self.direction else 1
+                self.direction = direction
+        else:
+            self.direction, self.streak = 1, 0
+        self._last = here
+        # what is still queued for the old neighbourhood is not worth making
+        self.service.pool.cancel(keep=[fobj.realpath for fobj in self._neighbours()],
+                                 foreground=False, running=False)
+        settings = fm.settings
+        if settings.preview_files and settings.use_preview_script:
+            self.due = time.time() + IDLE
+            self.service.start_pump()
+
+    def tick(self):
+        if self.due is None or time.time() < self.due:
+            return
+        self.due = None
+        service = self.service
+        for rank, fobj in enumerate(self._neighbours()):
+            path = fobj.realpath
+            if not fobj.is_file or not path or path in service.fm.previews \
+                    or service.pool.has(path):
+                continue
+            job = service.job(path, PREFETCH + rank)
+            if job is not None:
+                service.pool.submit(job)
+
+
+class PreviewPump(Loadable):
+    """Keeps ranger's main loop polling, and lets the Prefetcher start, while
+    there is work.  It waits at the end of the loader queue, behind directory
+    loads and other tasks, since ranger only works on queue[0]; finished jobs
+    are applied from ui.redraw, which runs on every pass of the main loop,
+    so they do not have to wait for it.  Removing it from the task view
+    cancels the jobs."""
+
+    def __init__(self, service):
+        self.service = service
+        Loadable.__init__(self, self._generate(), 'Getting previews')
+
+    def _generate(self):
+        pool = self.service.pool
+        prefetcher = self.service.prefetcher
+        loader = self.service.fm.loader
+        while pool.pending() or prefetcher.due is not None:
+            if loader.queue[0] is self and len(loader.queue) > 1:
+                # something was appended behind us; it goes first
+                loader.move(pos_src=0, pos_dest=-1)
+            prefetcher.tick()
+            pool.wake.wait(0.01)
+            pool.wake.clear()
+            yield
+
+    def destroy(self):
+        self.service.prefetcher.due = None
+        self.service.pool.cancel()
+        self.service.drain()
+        Loadable.destroy(self)
+
+
+class PreviewService(object):
+    """Stands in for fm.get_preview when use_preview_script is on."""
+
+    def __init__(self, fm, cachedir=None, workers=None):
+        self.fm = fm
+        cachedir = cachedir or ranger.args.cachedir
+        self.cache = DiskCache(os.path.join(cachedir, 'previews'))
+        self.pool = PreviewPool(self.cache, workers or max(2, min(4, os.cpu_count() or 1)))
+        self.prefetcher = Prefetcher(self)
+        self._pump = None
+        self._get_preview = fm.get_preview  # ranger's, for plain text previews
+        self._redraw = fm.ui.redraw
+        self._last = None  # (width, height, script signature) of the last preview
+
+    @classmethod
+    def install(cls, fm, **kwargs):
+        service = cls(fm, **kwargs)
+        fm.preview_service = service
+        fm.get_preview = service.get_preview
+        fm.ui.redraw = service.redraw
+        fm.signal_bind('move', service.prefetcher.on_move)
+        return service
+
+    def redraw(self):
+        """fm.ui.redraw: apply finished jobs first, wherever the pump is."""
+        self.drain()
+        self._redraw()
+
+    # ranger main thread --------------------------------------------------
+
+    def _script(self):
+        """Signature of the preview script, or None (after telling the user)
+        if it cannot be run."""
+        script = self.fm.settings.preview_script
+        try:
+            stat = os.stat(script)
+        except OSError:
+            self.fm.notify("Preview script `{0}` doesn't exist!".format(script), bad=True)
+            return None
+        if not stat.st_mode & S_IEXEC:
+            self.fm.notify("Preview script `{0}` is not executable!".format(script),
+                           bad=True)
+            return None
+        return (script, stat.st_mtime_ns, stat.st_size)
+
+    def _key(self, path, signature, script):
+        """The cache key of a preview of path, without the width."""
+        return (path,) + signature + (script, bool(self.fm.settings.preview_images))
+
+    def _job(self, path, key, width, height, cacheimg, priority=FOREGROUND):
+        settings = self.fm.settings
+        return Job(path, [settings.preview_script, path, str(width), str(height),
+                          cacheimg, str(settings.preview_images)],
+                   key, width, cacheimg, priority)
+
+    def settled(self):
+        """Whether previews are on and one has been asked for with the
+        current settings, so that there is a size to prefetch for."""
+        settings = self.fm.settings
+        return bool(self._last and settings.preview_files and settings.preview_script
+                    and settings.use_preview_script)
+
+    def job(self, path, priority):
+        """A background job making the preview of path the way the last
+        preview was made, or None if it is made already."""
+        if not self.settled():
+            return None
+        width, height, script = self._last
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        key = self._key(path, signature, script)
+        if self.cache.has(key + (width,), key + (ANY,)):
+            return None
+        return self._job(path, key, width, height, self.fm.sha1_encode(path), priority)
+
+    @staticmethod
+    def _lookup(data, width, height):
+        return data.get(
+            (-1, -1), data.get(
+                (width, -1), data.get(
+                    (-1, height), data.get(
+                        (width, height), False
+                    )
+                )
+            )
+        )
+
+    def _fill(self, data, path, width, height, rcode, content):
+        # what ranger's get_preview does with scope.sh's exit code
+        data['foundpreview'] = True
+        if rcode == 0:
+            data[(width, height)] = content
+        elif rcode == 3:
+            data[(-1, height)] = content
+        elif rcode == 4:
+            data[(width, -1)] = content
+        elif rcode == 5:
+            data[(-1, -1)] = content
+        elif rcode == 6:
+            data['imagepreview'] = True
+        elif rcode == 7:
+            data['directimagepreview'] = True
+        elif rcode == 1:
+            data[(-1, -1)] = None
+            data['foundpreview'] = False
+        elif rcode == 2:
+            data[(-1, -1)] = self.fm.read_text_file(path, 1024 * 32)
+        else:
+            data[(-1, -1)] = None
+        data['loading'] = False
+
+    def get_preview(self, fobj, width, height):
+        settings = self.fm.settings
+        if not settings.preview_script or not settings.use_preview_script:
+            return self._get_preview(fobj, width, height)
+
+        pager = self.fm.ui.get_pager()
+        path = fobj.realpath
+        signature = file_signature(path) if path else None
+        # the cursor is on path now; whatever else is being made for it is not
+        # needed (prefetch jobs are left alone)
+        self.pool.cancel(keep=(path,), background=False)
+        if signature is None:
+            return None
+
+        try:
+            data = self.fm.previews[path]
+        except KeyError:
+            data = self.fm.previews[path] = {'loading': False}
+        else:
+            if data['loading']:
+                return None
+
+        found = self._lookup(data, width, height)
+        if found is not False:
+            return found
+
+        script = self._script()
+        if script is None:
+            return None
+        self._last = (width, height, script)
+
+        if 'directimagepreview' in data:
+            data['foundpreview'] = True
+            data['imagepreview'] = True
+            pager.set_image(path)
+            return path
+
+        if not os.path.exists(ranger.args.cachedir):
+            os.makedirs(ranger.args.cachedir)
+        cacheimg = self.fm.sha1_encode(path)
+        if settings.preview_images and \
+                os.path.isfile(cacheimg) and \
+                os.path.getmtime(cacheimg) > os.path.getmtime(path):
+            data['foundpreview'] = True
+            data['imagepreview'] = True
+            pager.set_image(cacheimg)
+            return cacheimg
+
+        key = self._key(path, signature, script)
+        data['signature'] = key[1:]
+        stored = self.cache.get(key + (width,)) or self.cache.get(key + (ANY,))
+        if stored is not None:
+            self._fill(data, path, width, height, *stored)
+            if 'imagepreview' in data:
+                if os.path.isfile(cacheimg):
+                    pager.set_image(cacheimg)
+                    return cacheimg
+                # the image is gone; make it again
+                self.fm.previews[path] = data = {'loading': False,
+                                                 'signature': key[1:]}
+            elif 'directimagepreview' in data:
+                pager.set_image(path)
+                return path
+            else:
+                return self._lookup(data, width, height) or None
+
+        data['loading'] = True
+        job = self.pool.promote(path, key, width)
+        if job is None:
+            job = self._job(path, key, width, height, cacheimg)
+            self.pool.submit(job)
+        data['job'] = job
+        self.start_pump()
+        return None
+
+    def start_pump(self):
+        if self._pump is None or self._pump not in self.fm.loader.queue:
+            self._pump = PreviewPump(self)
+            self.fm.loader.add(self._pump, append=True)
+
+    def drain(self):
+        """Apply finished jobs to fm.previews and the preview pane."""
+        while self.pool.done:
+            job = self.pool.done.popleft()
+            data = self.fm.previews.get(job.path)
+            if data is None or data.get('job') is not job:
+                # prefetched, or superseded
+                continue
+            del data['job']
+            if job.cancelled or job.rcode is None or job.rcode < 0:
+                # like ranger's on_destroy: ask again when the file comes back
+                del self.fm.previews[job.path]
+                if self.fm.thisfile and self.fm.thisfile.realpath == job.path:
+                    self.fm.ui.browser.need_redraw = True
+                continue
+            width, height = int(job.args[2]), int(job.args[3])
+            self._fill(data, job.path, width, height, job.rcode, job.content)
+            thisfile = self.fm.thisfile
+            if not thisfile or thisfile.realpath != job.path:
+                continue
+            self.fm.ui.browser.need_redraw = True
+            if thisfile.is_file:
+                pager = self.fm.ui.get_pager()
+                if 'imagepreview' in data:
+                    pager.set_image(job.cacheimg)
+                elif 'directimagepreview' in data:
+                    pager.set_image(job.path)
+                else:
+                    pager.set_source(thisfile.get_preview_source(pager.wid, pager.hei))
+
+    def reset(self):
+        """Forget the previews of files that changed or vanished since they
+        were made, and all of them if the preview script changed."""
+        script = None
+        if self.fm.settings.preview_script:
+            try:
+                stat = os.stat(self.fm.settings.preview_script)
+                script = (self.fm.settings.preview_script, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        previews = self.fm.previews
+        stale = 0
+        for path, data in list(previews.items()):
+            if data['loading']:
+                continue
+            kept = data.get('signature')
+            if kept is None or kept[2] != script or kept[:2] != file_signature(path):
+                del previews[path]
+                self.cache.discard(path)
+                stale += 1
+        return stale
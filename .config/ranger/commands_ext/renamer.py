@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""In-process rename planner for :bulkrename.
+
+:bulkrename used to turn the edited file list into an `mv -vi` shell script
+and run it with /bin/sh: one process per file, and swaps like a -> b, b -> a
+failed because the second mv found its target taken.  Here the renames are
+planned first.  Every source has at most one target and every target at most
+one source, so the renames form chains and cycles: a chain is applied from
+its far end, and a cycle is opened by moving one member to a temporary name
+in its directory.  The plan is then applied with os.rename() in one pass and
+rolled back if a rename fails.  The applied operations are written to a
+journal so :bulkrename_undo can reverse them.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import json
+import os
+
+
+class PlanError(Exception):
+    pass
+
+
+def _staging_name(path, counter):
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.%s~bulkrename~%d~%d' % (tail, os.getpid(), counter))
+
+
+def plan(pairs):
+    """Order absolute (source, target) pairs into a list of os.rename()
+    operations.  Pairs with source == target are dropped.  Raises PlanError
+    when two sources share a target or a target is taken by a file that is
+    not renamed away."""
+    moves = {}
+    targets = {}
+    errors = []
+    for src, dst in pairs:
+        if src == dst:
+            continue
+        if dst in targets:
+            errors.append('%s and %s both renamed to %s' % (targets[dst], src, dst))
+            continue
+        moves[src] = dst
+        targets[dst] = src
+    for dst, src in targets.items():
+        if dst not in moves and os.path.lexists(dst):
+            errors.append('%s: %s already exists' % (src, dst))
+    if errors:
+        raise PlanError(errors)
+
+    ops = []
+    seen = set()
+    # chains: start at sources that are nobody's target, apply from the end
+    for head in moves:
+        if head in targets:
+            continue
+        chain = []
+        src = head
+        while src in moves:
+            seen.add(src)
+            chain.append((src, moves[src]))
+            src = moves[src]
+        ops.extend(reversed(chain))
+
+    # what is left are cycles
+    counter = 0
+    for first in moves:
+        if first in seen:
+            continue
+        counter += 1
+        staged = _staging_name(first, counter)
+        ops.append((first, staged))
+        chain = []
+        src = moves[first]
+        seen.add(first)
+        while src != first:
+            seen.add(src)
+            chain.append((src, moves[src]))
+            src = moves[src]
+        ops.extend(reversed(chain))
+        ops.append((staged, moves[first]))
+    return ops
+
+
+def apply(ops):
+    """Run the operations; on failure undo the ones done so far and re-raise
+    the OSError."""
+    done = []
+    try:
+        for src, dst in ops:
+            parent = os.path.dirname(dst)
+            if parent and not os.path.isdir(parent):
+                os.makedirs(parent)
+            os.rename(src, dst)
+            done.append((src, dst))
+    except OSError:
+        for src, dst in reversed(done):
+            try:
+                os.rename(dst, src)
+            except OSError:
+                pass
+        raise
+    return done
+
+
+def final_moves(ops):
+    """(source, target) of every file, with the staging steps folded away."""
+    origin = {}
+    for src, dst in ops:
+        origin[dst] = origin.pop(src, src)
+    return [(src, dst) for dst, src in origin.items()]
+
+
+def retag(tags, moves):
+    """Move tags along with their files, with a single write of the tags
+    file."""
+    tags.sync()
+    changed = False
+    carried = []
+    for src, dst in moves:
+        if src in tags.tags:
+            carried.append((dst, tags.tags.pop(src)))
+            changed = True
+    for dst, tag in carried:
+        tags.tags[dst] = tag
+    if changed:
+        tags.dump()
+    return changed
+
+
+def write_journal(fname, ops):
+    tmp = '%s.%d.tmp' % (fname, os.getpid())
+    with open(tmp, 'w') as fobj:
+        json.dump([list(op) for op in ops], fobj)
+    os.rename(tmp, fname)
+
+
+def read_journal(fname):
+    with open(fname) as fobj:
+        return [tuple(op) for op in json.load(fobj)]
+
+
+def benchmark(count=10000):
+    """Time planning and applying count renames, half of them in swaps."""
+    import shutil
+    import tempfile
+    import time
+    tmpdir = tempfile.mkdtemp()
+    try:
+        for i in range(count):
+            open(os.path.join(tmpdir, 'f%06d' % i), 'w').close()
+        pairs = []
+        for i in range(0, count - 1, 2):
+            a = os.path.join(tmpdir, 'f%06d' % i)
+            b = os.path.join(tmpdir, 'f%06d' % (i + 1))
+            if i % 4:
+                pairs += [(a, b), (b, a)]
+            else:
+                pairs += [(a, a + '.new'), (b, b + '.new')]
+        start = time.time()
+        ops = plan(pairs)
+        planned = time.time()
+        apply(ops)
+        applied = time.time()
+        return {'renames': len(pairs), 'operations': len(ops),
+                'plan_s': planned - start, 'apply_s': applied - planned}
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    for key, value in sorted(benchmark().items()):
+        print('%-12s %s' % (key, value))
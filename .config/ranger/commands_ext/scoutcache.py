@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Per-directory match cache for :scout.
+
+With -t, every keystroke used to run the pattern over every file of the
+directory, twice with -f (once in _count(), once in refilter()).  Here the
+names matching each pattern typed in a directory are remembered.  When the
+new pattern only narrows an earlier one (typically: one more character), only
+that pattern's matches are tested again, and going back with backspace is a
+lookup.  Positions in the visible file list come from a name -> index map when
+there are few matches; with many, the scan for the first two stops at the
+second one, which comes early.
+
+Without -f nothing needs the full list: _count() only wants to know whether
+there are zero, one or more matches and where the first is, so it skips
+building the list and scans from the cursor until the second match, unless
+the list is already cached.
+
+Entries are tied to a directory's files_all list, which ranger replaces on
+every reload, and to the files list for positions, which it replaces on every
+refilter.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import time
+from collections import OrderedDict
+
+# Up to this many matches, positions are looked up instead of scanned for.
+LOOKUP_LIMIT = 256
+
+
+class NameFilter(object):
+    """Stands in for a compiled regex as a directory's temporary_filter:
+    refilter() only calls .search(basename), and the status bar shows
+    .pattern."""
+
+    def __init__(self, names, pattern):
+        self.names = frozenset(names)
+        self.pattern = pattern
+
+    def search(self, name):
+        return name in self.names
+
+
+class ScoutCache(object):
+    """Maps directory path -> [files_all, all names, {key: names}, files,
+    positions]."""
+
+    def __init__(self, maxdirs=8, maxpatterns=64):
+        self.maxdirs = maxdirs
+        self.maxpatterns = maxpatterns
+        self._dirs = OrderedDict()
+
+    def _entry(self, directory):
+        files_all = directory.files_all
+        if files_all is None:
+            return None
+        entry = self._dirs.get(directory.path)
+        if entry is None or entry[0] is not files_all:
+            # keeping a reference to the list keeps its id from being reused
+            entry = [files_all, [fobj.relative_path for fobj in files_all],
+                     OrderedDict(), None, None]
+            self._dirs[directory.path] = entry
+            if len(self._dirs) > self.maxdirs:
+                self._dirs.popitem(last=False)
+        else:
+            self._dirs.move_to_end(directory.path)
+        return entry
+
+    def matches(self, directory, key, matcher, narrows):
+        """Relative paths in directory.files_all that matcher.search() accepts.
+
+        key identifies the pattern (and the flags that affect matching);
+        narrows(old_key) tells whether every match of key is a match of
+        old_key, so that only old_key's matches need to be tested.  Returns
+        None if the directory is not loaded yet.
+        """
+        entry = self._entry(directory)
+        if entry is None:
+            return None
+        patterns = entry[2]
+        names = patterns.get(key)
+        if names is not None:
+            patterns.move_to_end(key)
+            return names
+
+        candidates = None
+        for old_key in reversed(patterns):
+            if narrows(old_key) and (candidates is None
+                                     or len(patterns[old_key]) < len(candidates)):
+                candidates = patterns[old_key]
+        if candidates is None:
+            candidates = entry[1]
+        select = getattr(matcher, 'select', None)
+        if select is not None:
+            names = select(candidates)
+        else:
+            names = list(filter(matcher.search, candidates))
+
+        patterns[key] = names
+        if len(patterns) > self.maxpatterns:
+            patterns.popitem(last=False)
+        return names
+
+    def cached(self, directory, key):
+        """The names matches() returned for key, if still cached, else None.
+        Never computes anything."""
+        entry = self._dirs.get(directory.path)
+        if entry is None or entry[0] is not directory.files_all:
+            return None
+        return entry[2].get(key)
+
+    def _positions(self, directory):
+        entry = self._dirs[directory.path]
+        files = directory.files
+        if entry[3] is not files:
+            entry[3] = files
+            entry[4] = dict((fobj.relative_path, i) for i, fobj in enumerate(files))
+        return entry[4]
+
+    def first_two(self, directory, names, search, start):
+        """Indices in directory.files of up to two matching entries, in the
+        order they come when cycling from index start.  names are the
+        matches() for search, or None to scan with search alone."""
+        files = directory.files
+        size = len(files)
+        if not size:
+            return []
+        start %= size
+        if names is not None and len(names) <= LOOKUP_LIMIT:
+            positions = self._positions(directory)
+            found = sorted((i - start) % size for i in
+                           (positions.get(name) for name in names) if i is not None)
+            return [(i + start) % size for i in found[:2]]
+
+        found = []
+        for i in range(size):
+            index = (start + i) % size
+            if search(files[index].relative_path):
+                found.append(index)
+                if len(found) == 2:
+                    break
+        return found
+
+
+def benchmark(count=200000, typed='file_1234'):
+    """ms per keystroke when typing typed into a directory of count files:
+    compiling and scanning everything per key, the cache (-f), and the
+    early-stopping count without -f."""
+    import re
+    from commands_ext.matchers import matcher
+
+    class FakeFile(object):
+        def __init__(self, name):
+            self.relative_path = name
+
+    class FakeDir(object):
+        path = '/benchmark'
+
+    directory = FakeDir()
+    directory.files_all = directory.files = [FakeFile('file_%06d.txt' % i)
+                                             for i in range(count)]
+    cache = ScoutCache()
+    result = {}
+    for name in ('uncached', 'cached', 'count_only'):
+        start = time.time()
+        for length in range(1, len(typed) + 1):
+            pattern = typed[:length]
+            if name == 'count_only':
+                compiled = matcher(pattern, 's')
+                cache.first_two(directory, cache.cached(directory, pattern),
+                                compiled.search, 0)
+            elif name == 'cached':
+                compiled = matcher(pattern, 's')
+                names = cache.matches(directory, pattern, compiled,
+                                      lambda old, pattern=pattern: pattern.startswith(old))
+                cache.first_two(directory, names, compiled.search, 0)
+            else:
+                # what refilter() does with -f
+                search = re.compile(re.escape(pattern), re.IGNORECASE).search
+                [fobj for fobj in directory.files if search(fobj.relative_path)]
+        result[name + '_ms_per_key'] = (time.time() - start) * 1000 / len(typed)
+    return result
+
+
+if __name__ == '__main__':
+    for key, value in sorted(benchmark().items()):
+        print('%-24s %.2f' % (key, value))
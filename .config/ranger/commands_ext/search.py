@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""In-process grep for :grep.
+
+:grep used to run `grep --line-number -r` in the foreground pager mode, so
+nothing showed until grep was done, it used one core and it looked into
+everything hidden_filter hides.  GrepJob walks the selection itself (skipping
+hidden names unless show_hidden is on), searches files on a thread pool with
+mmap, skips binary files like grep does, and streams `path:line:text` lines
+into the pager while it runs.  Removing it from the task view cancels it.
+:grep_jump takes you to a match with fm.select_file().
+
+The pattern is a Python regular expression (a literal string if it does not
+compile).
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ranger.core.loader import Loadable
+
+BINARY_PROBE = 8192   # bytes checked for NUL, like grep's first buffer
+MAX_RESULTS = 100000  # stop searching after this many matching lines
+
+
+def compile_pattern(pattern):
+    data = os.fsencode(pattern)
+    try:
+        return re.compile(data, re.MULTILINE)
+    except re.error:
+        return re.compile(re.escape(data))
+
+
+def search_file(path, regex, found):
+    """Call found(path, lineno, line) for each matching line of path, or
+    found(path, None, None) once if path is binary and matches.  Returns the
+    number of matching lines."""
+    with open(path, 'rb') as fobj:
+        size = os.fstat(fobj.fileno()).st_size
+        if not size:
+            return 0
+        with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if b'\0' in data[:BINARY_PROBE]:
+                if regex.search(data):
+                    found(path, None, None)
+                    return 1
+                return 0
+            count = 0
+            lineno = 1
+            counted_to = 0
+            pos = 0
+            while pos < size:
+                match = regex.search(data, pos)
+                if match is None:
+                    break
+                if match.start() >= size and data[size - 1:] == b'\n':
+                    # an empty match after the final newline; that is no line
+                    break
+                start = data.rfind(b'\n', 0, match.start()) + 1
+                end = data.find(b'\n', match.end())
+                if end < 0:
+                    end = size
+                lineno += data[counted_to:start].count(b'\n')
+                counted_to = start
+                found(path, lineno, os.fsdecode(data[start:end]).rstrip('\r'))
+                count += 1
+                pos = end + 1
+            return count
+
+
+class GrepJob(Loadable):
+    """Searches the given paths and appends result lines to self.lines, which
+    is the open pager's source."""
+
+    max_workers = 4
+    # The most recent job, for :grep_jump
+    latest = None
+
+    def __init__(self, fm, paths, pattern, hidden_filter=None):
+        self.fm = fm
+        self.pattern = pattern
+        self.regex = compile_pattern(pattern)
+        self.hidden = re.compile(hidden_filter).search if hidden_filter else None
+        self.lines = ['grep %s: searching...' % pattern]
+        self.matches = []  # (path, lineno), lineno is None for binary files
+        self.current = None  # index into matches of the last :grep_jump
+        self.files = 0
+        self.errors = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._started = time.time()
+        self._base = fm.thisdir.path
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._walker = self._pool.submit(self._walk, paths)
+        Loadable.__init__(self, self._generate(), 'grep %s' % pattern)
+
+    # worker threads ------------------------------------------------------
+
+    def _found(self, path, lineno, line):
+        with self._lock:
+            self._pending.append((path, lineno, line))
+            if len(self.matches) + len(self._pending) >= MAX_RESULTS:
+                self._cancel.set()
+
+    def _search(self, path):
+        if self._cancel.is_set():
+            return
+        try:
+            search_file(path, self.regex, self._found)
+        except (OSError, ValueError):
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            self.files += 1
+
+    def _walk(self, paths):
+        futures = []
+        stack = list(reversed(paths))
+        while stack and not self._cancel.is_set():
+            path = stack.pop()
+            if os.path.isfile(path):
+                futures.append(self._pool.submit(self._search, path))
+                continue
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                with self._lock:
+                    self.errors += 1
+                continue
+            subdirs = []
+            for entry in entries:
+                if self.hidden and self.hidden(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        futures.append(self._pool.submit(self._search, entry.path))
+                except OSError:
+                    continue
+            stack.extend(reversed(subdirs))
+        for future in futures:
+            future.result()
+
+    # ranger main thread --------------------------------------------------
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        for path, lineno, line in pending:
+            shown = os.path.relpath(path, self._base)
+            self.matches.append((path, lineno))
+            if lineno is None:
+                self.lines.append('Binary file %s matches' % shown)
+            else:
+                self.lines.append('%s:%d:%s' % (shown, lineno, line))
+        pager = self.fm.ui.pager
+        if pager.source is self.lines:
+            pager.max_width = max(pager.max_width or 0,
+                                  max(len(line) for line in self.lines[-len(pending):]))
+            pager.need_redraw = True
+
+    def _header(self, state):
+        return 'grep %s: %d matches in %d files, %s (%.1fs)' % (
+            self.pattern, len(self.matches), self.files, state,
+            time.time() - self._started)
+
+    def _generate(self):
+        while not self._walker.done():
+            self._drain()
+            self.description = self._header('searching')
+            self.lines[0] = self.description
+            self.fm.ui.status.need_redraw = True
+            yield
+        self._finish()
+
+    def _finish(self):
+        self._pool.shutdown(wait=False)
+        self._drain()
+        if len(self.matches) >= MAX_RESULTS:
+            state = 'stopped at %d matches' % MAX_RESULTS
+        elif self._cancel.is_set():
+            state = 'cancelled'
+        else:
+            state = 'done'
+        if self.errors:
+            state += ', %d unreadable' % self.errors
+        self.lines[0] = self._header(state)
+        if self.fm.ui.pager.source is self.lines:
+            self.fm.ui.pager.need_redraw = True
+
+    def destroy(self):
+        # the loader drops the generator; say in the pager that it stopped
+        self._cancel.set()
+        self._finish()
+        Loadable.destroy(self)
+
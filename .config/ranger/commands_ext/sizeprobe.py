@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Cheap emptiness check and a background size probe for :delete / :trash.
+
+has_entries() reads at most one directory entry instead of a full
+os.listdir().  SizeProbe counts entries and bytes of a selection on a worker
+thread, so a slow mount does not freeze the UI, and a loader job publishes
+the totals: the confirmation prompt shows up immediately and its numbers
+fill in as they arrive.  Answering or closing the prompt stops the count.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+import threading
+
+from ranger.core.loader import Loadable
+from ranger.ext.human_readable import human_readable
+
+
+def has_entries(path):
+    """True for a real (non-symlink) directory that is not empty."""
+    try:
+        if os.path.islink(path) or not os.path.isdir(path):
+            return False
+        with os.scandir(path) as it:
+            for _ in it:
+                return True
+    except OSError:
+        pass
+    return False
+
+
+def walk_sizes(paths, batch=256):
+    """Yield running (entries, bytes) totals for paths, without following
+    symlinks, every `batch` entries and once more at the end."""
+    count = size = 0
+    stack = []
+    for path in paths:
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            continue
+        count += 1
+        size += stat.st_size
+        if os.path.isdir(path) and not os.path.islink(path):
+            stack.append(path)
+
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    size += entry.stat(follow_symlinks=False).st_size
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                except OSError:
+                    pass
+                count += 1
+                if count % batch == 0:
+                    yield count, size
+    yield count, size
+
+
+class SizeProbe(Loadable):
+    """Fills "[N entries, X]" into a pending console question."""
+
+    def __init__(self, fm, paths, head, tail=' (y/N)'):
+        self.fm = fm
+        self.head = head
+        self.tail = tail
+        self.text = head + tail
+        self.totals = None  # (entries, bytes) so far, set by the worker
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._walk, args=(paths,))
+        self._thread.daemon = True
+        Loadable.__init__(self, self._generate(), 'Counting selection')
+
+    def start(self):
+        self._thread.start()
+        # behind directory loads and the like; it only updates the prompt
+        self.fm.loader.add(self, append=True)
+        return self
+
+    def cancel(self):
+        self.fm.loader.remove(item=self)
+
+    def destroy(self):
+        self._cancel.set()
+        Loadable.destroy(self)
+
+    # worker thread -------------------------------------------------------
+
+    def _walk(self, paths):
+        for totals in walk_sizes(paths):
+            self.totals = totals
+            if self._cancel.is_set():
+                return
+
+    # ranger main thread --------------------------------------------------
+
+    def _generate(self):
+        shown = None
+        while self._thread.is_alive():
+            if not self._asking():
+                # the prompt went away without an answer reaching us
+                self._cancel.set()
+                return
+            totals = self.totals
+            if totals is not None and totals != shown:
+                shown = totals
+                self._show('%d entries, %s...' % (totals[0], human_readable(totals[1])))
+            yield
+        if self.totals is not None:
+            self._show('%d entries, %s' % (self.totals[0], human_readable(self.totals[1])))
+
+    def _asking(self):
+        return any(question[0] == self.text
+                   for question in self.fm.ui.console.question_queue)
+
+    def _show(self, info):
+        text = '%s [%s]%s' % (self.head, info, self.tail)
+        queue = self.fm.ui.console.question_queue
+        for i, question in enumerate(queue):
+            if question[0] == self.text:
+                queue[i] = (text,) + tuple(question[1:])
+                self.text = text
+                self.fm.ui.console.need_redraw = True
+                break
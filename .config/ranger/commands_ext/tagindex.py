@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tags grouped by parent directory and tag character, for :mark_tag.
+
+:mark_tag used to look up every file of the current directory in the tags
+dict, resolving each file's realpath on the way.  Here the tags are grouped
+once per version of the tags dict (ranger's Tags re-reads the tags file into a
+new dict on every change, so the dict's identity is the version), and the
+current directory's entries are found by name.  Only symlinks still need
+their realpath, because their tag is stored under the link target.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import os
+from collections import OrderedDict
+
+
+class TagIndex(object):
+    """{directory: {tag: [basename, ...]}} for the current tags dict, plus a
+    basename -> (position, file object) map per directory listing
+    (LRU-bounded)."""
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._tags = None
+        self._by_dir = {}
+        self._listings = OrderedDict()
+
+    def _grouped(self, tags):
+        if tags is not self._tags:
+            by_dir = {}
+            for path, tag in tags.items():
+                head, name = os.path.split(path)
+                by_dir.setdefault(head, {}).setdefault(tag, []).append(name)
+            # keeping a reference to the dict keeps its id from being reused
+            self._tags = tags
+            self._by_dir = by_dir
+        return self._by_dir
+
+    def _listing(self, directory):
+        files = directory.files
+        entry = self._listings.get(directory.path)
+        if entry is not None and entry[0] is files:
+            self._listings.move_to_end(directory.path)
+            return entry[1], entry[2]
+        by_name = {}
+        links = []
+        for position, fobj in enumerate(files):
+            by_name[fobj.basename] = (position, fobj)
+            if fobj.is_link:
+                links.append(fobj)
+        self._listings[directory.path] = (files, by_name, links)
+        if len(self._listings) > self.maxsize:
+            self._listings.popitem(last=False)
+        return by_name, links
+
+    def tagged(self, tags, directory, wanted=''):
+        """File objects of directory tagged with any tag in wanted (any tag at
+        all if wanted is empty), in listing order."""
+        by_name, links = self._listing(directory)
+        result = []
+        for tag, names in self._grouped(tags).get(directory.path, {}).items():
+            if wanted and tag not in wanted:
+                continue
+            for name in names:
+                found = by_name.get(name)
+                # a link's tag is stored under its target, not under its name
+                if found is not None and not found[1].is_link:
+                    result.append(found)
+        for fobj in links:
+            tag = tags.get(fobj.realpath)
+            if tag is not None and (not wanted or tag in wanted):
+                result.append(by_name[fobj.basename])
+        result.sort(key=lambda found: found[0])
+        return [fobj for _, fobj in result]
+
+
+def mark_batch(directory, items, val):
+    """Like calling directory.mark_item() for each item, without the linear
+    membership tests per item."""
+    marked = directory.marked_items
+    present = set(id(fobj) for fobj in marked)
+    if val:
+        for fobj in items:
+            fobj.mark_set(True)
+            if id(fobj) not in present:
+                present.add(id(fobj))
+                marked.append(fobj)
+    else:
+        drop = set(id(fobj) for fobj in items)
+        for fobj in items:
+            fobj.mark_set(False)
+        if present & drop:
+            marked[:] = [fobj for fobj in marked if id(fobj) not in drop]
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""In-process FreeDesktop.org trash for :trash, :trash_list and :trash_restore.
+
+Going through rifle forks an external trash tool for every invocation.  Here
+files are moved with os.rename() into the trash of their own filesystem:
+the home trash ($XDG_DATA_HOME/Trash) for the home device, otherwise
+$topdir/.Trash/$uid if the administrator set up a sticky $topdir/.Trash, or
+else $topdir/.Trash-$uid, as the spec describes.  Trash directories on other
+filesystems are only used if they are real directories owned by the user,
+so a hostile mount cannot redirect trashed files with symlinks.  Only if no trash on that device is
+usable is the file copied into the home trash and then deleted.  Work is
+grouped per device, one worker thread per group, and queued in ranger's
+loader like a directory load.
+
+https://specifications.freedesktop.org/trash-spec/trashspec-latest.html
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import errno
+import os
+import shutil
+import stat
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from urllib.parse import quote, unquote_to_bytes
+except ImportError:
+    from urllib import quote, unquote as unquote_to_bytes  # pylint: disable=no-name-in-module
+
+from ranger.core.loader import Loadable
+
+TrashEntry = namedtuple('TrashEntry', 'original deleted trash_dir name')
+
+INFO_SUFFIX = '.trashinfo'
+
+# Filesystems whose trash :trash_list and :trash_restore do not look for:
+# remote ones (a dead server hangs the lstat), automount points (the lstat
+# mounts them) and pseudo filesystems.  FUSE filesystems other than fuseblk
+# (ntfs-3g, exfat) are mostly remote too ("fuse.sshfs", "fuse.rclone").
+SKIP_FSTYPES = frozenset((
+    'autofs', 'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', '9p', 'afs',
+    'ceph', 'glusterfs', 'davfs', 'fuse', 'fusectl', 'proc', 'sysfs',
+    'devtmpfs', 'devpts', 'cgroup', 'cgroup2', 'pstore', 'bpf', 'debugfs',
+    'tracefs', 'securityfs', 'configfs', 'mqueue', 'hugetlbfs', 'binfmt_misc',
+    'efivarfs', 'selinuxfs', 'rpc_pipefs', 'nsfs', 'ramfs', 'squashfs',
+))
+
+
+def home_trash():
+    data_home = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_home, 'Trash')
+
+
+def _topdir(path):
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def trash_dir_for(path):
+    """The trash directory on path's filesystem, or None if there is none
+    we may use (then the caller falls back to copying into the home trash)."""
+    home = home_trash()
+    try:
+        dev = os.lstat(path).st_dev
+        os.makedirs(home, exist_ok=True)
+        if os.stat(home).st_dev == dev:
+            return home
+    except OSError:
+        return None
+
+    return topdir_trash(_topdir(os.path.dirname(os.path.abspath(path))), create=True)
+
+
+def _trash_top(trash):
+    """Where relative Path= values in trash start: $topdir for the trash of
+    a mounted filesystem, the directory of the home trash for that one."""
+    parent = os.path.dirname(trash)
+    if os.path.basename(parent) == '.Trash' and trash != home_trash():
+        return os.path.dirname(parent)
+    return parent
+
+
+def _private_dir(path, uid, create=False):
+    """Whether path is a directory, not a symlink, owned by uid; with
+    create, it is made (mode 0700) if missing."""
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                return False
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == uid
+
+
+def topdir_trash(top, create=False):
+    """The trash directory of the filesystem mounted at top, or None."""
+    uid = os.getuid()
+    candidates = []
+    # method 1: the administrator's .Trash, a sticky directory (no symlink)
+    shared = os.path.join(top, '.Trash')
+    try:
+        st = os.lstat(shared)
+    except OSError:
+        st = None
+    if st is not None and stat.S_ISDIR(st.st_mode) and st.st_mode & stat.S_ISVTX:
+        candidates.append(os.path.join(shared, str(uid)))
+    # method 2
+    candidates.append(os.path.join(top, '.Trash-%d' % uid))
+
+    for candidate in candidates:
+        if all(_private_dir(sub, uid, create) for sub in
+               (candidate, os.path.join(candidate, 'files'),
+                os.path.join(candidate, 'info'))):
+            return candidate
+    return None
+
+
+def _reserve(trash, basename, original):
+    """Atomically create the .trashinfo file under a free name; returns the
+    name.  Creating the info file first is what the spec requires.  In the
+    trash of a mounted filesystem, Path= is relative to its $topdir."""
+    info_dir = os.path.join(trash, 'info')
+    os.makedirs(info_dir, exist_ok=True)
+    os.makedirs(os.path.join(trash, 'files'), exist_ok=True)
+    stored = original
+    if trash != home_trash():
+        top = _trash_top(trash)
+        if original.startswith(top.rstrip(os.sep) + os.sep):
+            stored = os.path.relpath(original, top)
+    content = '[Trash Info]\nPath=%s\nDeletionDate=%s\n' % (
+        # bytes, so that undecodable (surrogateescape) names quote too
+        quote(os.fsencode(stored)), time.strftime('%Y-%m-%dT%H:%M:%S'))
+    name = basename
+    counter = 1
+    while True:
+        try:
+            fd = os.open(os.path.join(info_dir, name + INFO_SUFFIX),
+                         os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise
+            counter += 1
+            name = '%s.%d' % (basename, counter)
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        return name
+
+
+def trash_path(path, trash=None):
+    """Move one path into the trash.  Returns the TrashEntry."""
+    original = os.path.abspath(path)
+    copy = trash is None
+    if copy:
+        trash = home_trash()
+    name = _reserve(trash, os.path.basename(original.rstrip(os.sep)), original)
+    target = os.path.join(trash, 'files', name)
+    try:
+        if copy:
+            _move_across_devices(original, target)
+        else:
+            os.rename(original, target)
+    except OSError:
+        os.unlink(os.path.join(trash, 'info', name + INFO_SUFFIX))
+        raise
+    return TrashEntry(original, time.strftime('%Y-%m-%dT%H:%M:%S'), trash, name)
+
+
+def _move_across_devices(src, dst):
+    if os.path.isdir(src) and not os.path.islink(src):
+        shutil.copytree(src, dst, symlinks=True)
+        shutil.rmtree(src)
+    else:
+        shutil.copy2(src, dst, follow_symlinks=False)
+        os.unlink(src)
+
+
+class TrashJob(Loadable):
+    """Trashes paths, one worker per filesystem.  Removing it from the task
+    view cancels it."""
+
+    def __init__(self, fm, paths):
+        self.fm = fm
+        self.total = len(paths)
+        # the listings to refresh at the end; the user may have moved on
+        self.parents = sorted(set(os.path.dirname(path) for path in paths))
+        self.done = 0
+        self.errors = []
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+        groups = {}
+        for path in paths:
+            try:
+                dev = os.lstat(path).st_dev
+            except OSError as err:
+                self.errors.append(err)
+                continue
+            groups.setdefault(dev, []).append(path)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, len(groups)))
+        self._futures = [pool.submit(self._trash_group, group) for group in groups.values()]
+        pool.shutdown(wait=False)
+        Loadable.__init__(self, self._generate(), 'Trashing %d item(s)' % self.total)
+
+    def _trash_group(self, paths):
+        # all paths share a device, so they share a trash directory
+        trash = trash_dir_for(paths[0])
+        for path in paths:
+            if self._cancel.is_set():
+                return
+            try:
+                trash_path(path, trash)
+            except OSError as err:
+                with self._lock:
+                    self.errors.append(err)
+                continue
+            with self._lock:
+                self.done += 1
+
+    def _generate(self):
+        while not all(future.done() for future in self._futures):
+            self.description = 'Trashing: %d/%d' % (self.done, self.total)
+            self.percent = 100 * self.done // max(self.total, 1)
+            self.fm.ui.status.need_redraw = True
+            yield
+        self._finish()
+
+    def _finish(self):
+        if self._cancel.is_set():
+            self.fm.notify('Trashing cancelled after %d of %d' % (self.done, self.total),
+                           bad=True)
+        elif self.errors:
+            self.fm.notify('Trashed %d of %d, %d errors (first: %s)'
+                           % (self.done, self.total, len(self.errors), self.errors[0]),
+                           bad=True)
+        else:
+            self.fm.notify('Moved %d item(s) to the trash' % self.done)
+        for parent in self.parents:
+            self.fm.get_directory(parent).content_outdated = True
+        self.fm.thistab.ensure_correct_pointer()
+
+    def destroy(self):
+        # the loader drops the generator, so _finish() is up to us
+        self._cancel.set()
+        self._finish()
+        Loadable.destroy(self)
+
+
+# Listing / restoring -------------------------------------------------------
+
+def _trash_dirs():
+    """Home trash plus the trash of every local mounted filesystem that has
+    one."""
+    dirs = [home_trash()]
+    try:
+        with open('/proc/self/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if fields[2] in SKIP_FSTYPES or fields[2].startswith('fuse.'):
+                    continue
+                mountpoint = fields[1].replace('\\040', ' ')
+                candidate = topdir_trash(mountpoint)
+                if candidate is not None and candidate not in dirs:
+                    dirs.append(candidate)
+    except OSError:
+        pass
+    return dirs
+
+
+def _read_info(path):
+    original = deleted = None
+    with open(path) as f:
+        for line in f:
+            if line.startswith('Path='):
+                original = os.fsdecode(unquote_to_bytes(line[5:].rstrip('\n')))
+            elif line.startswith('DeletionDate='):
+                deleted = line[13:].rstrip('\n')
+    return original, deleted
+
+
+class TrashIndex(object):
+    """Parsed .trashinfo files per trash directory, re-read only when the
+    info directory's mtime changes."""
+
+    def __init__(self):
+        self._cache = {}
+
+    def _entries(self, trash):
+        info_dir = os.path.join(trash, 'info')
+        try:
+            mtime = os.stat(info_dir).st_mtime_ns
+        except OSError:
+            self._cache.pop(trash, None)
+            return []
+        cached = self._cache.get(trash)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        entries = []
+        with os.scandir(info_dir) as it:
+            for dirent in it:
+                if not dirent.name.endswith(INFO_SUFFIX):
+                    continue
+                try:
+                    original, deleted = _read_info(dirent.path)
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if original is None:
+                    continue
+                if not os.path.isabs(original):
+                    original = os.path.join(_trash_top(trash), original)
+                entries.append(TrashEntry(original, deleted or '', trash,
+                                          dirent.name[:-len(INFO_SUFFIX)]))
+        self._cache[trash] = (mtime, entries)
+        return entries
+
+    def entries(self):
+        """All trashed items, most recently deleted first."""
+        result = []
+        for trash in _trash_dirs():
+            result.extend(self._entries(trash))
+        result.sort(key=lambda entry: entry.deleted, reverse=True)
+        return result
+
+    def find(self, original):
+        """Most recently trashed entry for an original path, or None."""
+        original = os.path.abspath(original)
+        for entry in self.entries():
+            if entry.original == original:
+                return entry
+        return None
+
+
+def restore(entry):
+    """Move a trashed item back to its original location."""
+    if os.path.lexists(entry.original):
+        raise OSError('%s already exists' % entry.original)
+    source = os.path.join(entry.trash_dir, 'files', entry.name)
+    parent = os.path.dirname(entry.original)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    try:
+        os.rename(source, entry.original)
+    except OSError:
+        _move_across_devices(source, entry.original)
+    os.unlink(os.path.join(entry.trash_dir, 'info', entry.name + INFO_SUFFIX))
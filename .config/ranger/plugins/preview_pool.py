@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+"""Run scope.sh previews through commands_ext/previews.py."""
+
+from __future__ import (absolute_import, division, print_function)
+
+import ranger.api
+
+from commands_ext.previews import PreviewService
+
+HOOK_INIT_OLD = ranger.api.hook_init
+
+
+def hook_init(fm):
+    PreviewService.install(fm)
+    return HOOK_INIT_OLD(fm)
+
+
+ranger.api.hook_init = hook_init
@@ -1,15 +1,63 @@
 import os
+from collections import OrderedDict
 import ranger.api
 from ranger.core.linemode import LinemodeBase
-from .devicons import *
+# icons.py loads the icon table on first use; devicons.py is not imported here
+from .icons import icon_for
 
 SEPARATOR = os.getenv('RANGER_DEVICONS_SEPARATOR', ' ')
 
+# Rows computed together when a title is missing: a screenful and then some.
+BATCH = 128
+
 @ranger.api.register_linemode
 class DevIconsLinemode(LinemodeBase):
   name = "devicons"
 
   uses_metadata = False
 
+  def __init__(self):
+    # directory path -> [files list, {file id: index}, titles]; a new files
+    # list (reload, refilter, resort) starts over
+    self._columns = OrderedDict()
+
+  def _column(self, directory):
+    files = directory.files
+    column = self._columns.get(directory.path)
+    if column is None or column[0] is not files:
+      column = [files, None, [None] * len(files)]
+      self._columns[directory.path] = column
+      if len(self._columns) > 16:
+        self._columns.popitem(last=False)
+    else:
+      self._columns.move_to_end(directory.path)
+    return column
+
+  def titles(self, directory, start, stop):
+    """Icon + title strings for directory.files[start:stop], computed for the
+    whole range at once and kept until the listing changes."""
+    column = self._column(directory)
+    files, titles = column[0], column[2]
+    for i in range(max(start, 0), min(stop, len(files))):
+      if titles[i] is None:
+        fobj = files[i]
+        titles[i] = icon_for(fobj.basename, fobj.is_directory) + SEPARATOR + fobj.relative_path
+    return titles[start:stop]
+
   def filetitle(self, file, metadata):
-    return devicon(file) + SEPARATOR + file.relative_path
+    # ranger asks row by row; answer from the batch of the column the row is in
+    directory = file.fm.directories.get(file.dirname) if file.fm else None
+    if directory is not None and directory.files:
+      column = self._column(directory)
+      if column[1] is None:
+        column[1] = dict((id(fobj), i) for i, fobj in enumerate(column[0]))
+      i = column[1].get(id(file))
+      if i is not None:
+        title = column[2][i]
+        if title is None:
+          start = directory.scroll_begin
+          if not start <= i < start + BATCH:
+            start = i
+          title = self.titles(directory, start, start + BATCH)[i - start]
+        return title
+    return icon_for(file.basename, file.is_directory) + SEPARATOR + file.relative_path
@@ -0,0 +1,43 @@
+# Startup cost of the plugin.
+#
+#   cd ~/.config/ranger/plugins && python -m ranger_devicons.benchmark
+#
+# Times, in fresh interpreters, the ranger modules that are already loaded
+# when plugins are imported, and on top of them: this plugin, the old eager
+# import of the icon tables, and the first icon lookup with and without the
+# compiled table (see icons.py).
+import os
+import subprocess
+import sys
+
+PLUGINS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# what ranger has loaded by the time it imports plugins
+BASE = 'import ranger.api, ranger.core.linemode, ranger.container.file'
+CASES = [
+  ('import plugin', 'import ranger_devicons'),
+  ('import icon tables', 'import ranger_devicons.devicons'),
+  ('first icon, compiled', 'from ranger_devicons.icons import icon_for;'
+                           ' icon_for("a.py", False)'),
+  ('first icon, from source', 'from ranger_devicons import icons;'
+                              ' icons.CACHE = "/nonexistent/devicons.marshal";'
+                              ' icons.icon_for("a.py", False)'),
+]
+
+def run(code, setup=BASE):
+  out = subprocess.check_output(
+    [sys.executable, '-c', '%s; import time; t = time.perf_counter(); %s; '
+                           'print(time.perf_counter() - t)' % (setup, code)],
+    cwd=PLUGINS)
+  return float(out.decode().split()[-1])
+
+def benchmark(runs=10):
+  """Best-of-runs ms for each case, on top of ranger's own imports, which
+  are timed as 'ranger'."""
+  run(CASES[2][1])  # make sure the compiled table exists
+  result = [('ranger', min(run(BASE, setup='pass') for _ in range(runs)) * 1000)]
+  result.extend((name, min(run(code) for _ in range(runs)) * 1000) for name, code in CASES)
+  return result
+
+if __name__ == '__main__':
+  for name, ms in benchmark():
+    print('%-24s %6.2f ms' % (name, ms))
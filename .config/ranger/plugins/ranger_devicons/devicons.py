@@ -374,6 +374,23 @@ file_node_exact_matches = {
     'webpack.config.js'                : '',
 }
 
+# One merged table, compiled once into a cache file by icons.py so that ranger
+# does not have to import this module at all: directory names under
+# '/' + name, file names as they are, extensions under '*.' + extension.
+# Every key is also present in lower case (the exact spelling wins where both
+# exist, e.g. Dockerfile / dockerfile), so README.md and readme.md get the same
+# icon.
+icon_table = {}
+for _name, _icon in dir_node_exact_matches.items():
+  icon_table['/' + _name] = _icon
+for _name, _icon in file_node_exact_matches.items():
+  icon_table[_name] = _icon
+for _ext, _icon in file_node_extensions.items():
+  icon_table['*.' + _ext] = _icon
+for _key, _icon in list(icon_table.items()):
+  icon_table.setdefault(_key.lower(), _icon)
+del _name, _ext, _key, _icon
+
 def devicon(file):
-  if file.is_directory: return dir_node_exact_matches.get(file.relative_path, '')
-  return file_node_exact_matches.get(os.path.basename(file.relative_path), file_node_extensions.get(file.extension, ''))
+  from .icons import icon_for
+  return icon_for(file.basename, file.is_directory)
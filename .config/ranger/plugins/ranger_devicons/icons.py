@@ -0,0 +1,79 @@
+# coding=UTF-8
+# Lazily loaded, precompiled icon table.
+#
+# devicons.py builds its dicts (and the merged icon_table) at import time,
+# which used to happen during ranger startup.  Here nothing is loaded until
+# the first icon is needed; then icon_table comes from a marshal file in
+# ranger's cache directory, and devicons.py is only imported (and the file
+# rewritten) when devicons.py or the XDG_*_DIR variables it reads have changed.
+#
+# `python -m ranger_devicons.benchmark` (from the plugins directory) measures
+# what this saves.
+import marshal
+import os
+from functools import lru_cache
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'devicons.py')
+CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                     'ranger', 'devicons.marshal')
+
+DIR_DEFAULT = ''
+FILE_DEFAULT = ''
+
+# The environment variables devicons.py reads (for xdgs_dirs)
+XDG_DIRS = ('XDG_DOCUMENTS_DIR', 'XDG_DOWNLOAD_DIR', 'XDG_CONFIG_DIR', 'XDG_MUSIC_DIR',
+            'XDG_PICTURES_DIR', 'XDG_PUBLICSHARE_DIR', 'XDG_TEMPLATES_DIR', 'XDG_VIDEOS_DIR')
+
+_table = None
+
+def _source_key():
+  st = os.stat(SOURCE)
+  xdg = tuple(os.environ.get(name) for name in XDG_DIRS)
+  return (marshal.version, st.st_mtime_ns, st.st_size, xdg)
+
+def _compile(key):
+  from .devicons import icon_table
+  try:
+    os.makedirs(os.path.dirname(CACHE), exist_ok=True)
+    tmp = '%s.%d.tmp' % (CACHE, os.getpid())
+    with open(tmp, 'wb') as f:
+      marshal.dump((key, icon_table), f)
+    os.replace(tmp, CACHE)
+  except OSError:
+    pass
+  return icon_table
+
+def table():
+  global _table
+  if _table is None:
+    key = _source_key()
+    try:
+      with open(CACHE, 'rb') as f:
+        cached_key, cached = marshal.load(f)
+      if cached_key == key:
+        _table = cached
+    except (OSError, EOFError, ValueError, TypeError):
+      pass
+    if _table is None:
+      _table = _compile(key)
+  return _table
+
+@lru_cache(maxsize=8192)
+def icon_for(name, is_directory):
+  """Icon for a basename; memoized, as a listing asks for the same names on
+  every redraw."""
+  icons = table()
+  key = '/' + name if is_directory else name
+  icon = icons.get(key)
+  if icon is None:
+    icon = icons.get(key.lower())
+  if icon is not None:
+    return icon
+  if is_directory:
+    return DIR_DEFAULT
+  # webpack.config.js, README.md, ... were exact matches above; everything
+  # else goes by its last extension
+  dot = name.rfind('.')
+  if dot >= 0:
+    return icons.get('*.' + name[dot + 1:].lower(), FILE_DEFAULT)
+  return FILE_DEFAULT
@@ -98,7 +98,7 @@ EOF
 dnf -y install \
   btop gnome-keyring-pam copyq network-manager-applet \
   redshift pulseaudio-utils pavucontrol bluez bluez-libs \
-  python3-dbus acpid kitty vlc xcompmgr powerline-fonts 
+  python3-dbus acpid kitty vlc xcompmgr powerline-fonts ImageMagick
 
 
 ### 4. Flatpak GUI apps ───────────────────────────────────────────────────────